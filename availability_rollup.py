@@ -0,0 +1,227 @@
+"""Daily availability per country and brand.
+
+AvailabilityDaily keeps one row per (day, country, brand) with the SKUs
+observed that day, the SKUs seen out of stock, the availability percentage,
+the minutes SKUs spent out of stock and the average of their last price of the
+day. After every scrape batch only the days and markets in the batch are
+recomputed, from that day's ProductStatus rows and the status each SKU had at
+the start of the day (its last StockEvents status event). Trend charts read
+the rollup alone.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from db import run_once
+from stock_events import ensure_stock_events
+
+ROLLUP_KEY = ['Day', 'CountryCode', 'BrandName']
+# Days recomputed per statement when the rollup is backfilled
+BACKFILL_DAYS = 31
+
+
+def ensure_availability_rollup(conn):
+    ensure_stock_events(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT OBJECT_ID('AvailabilityDaily', 'U')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute("""
+        CREATE TABLE AvailabilityDaily (
+            Day DATE NOT NULL,
+            CountryID INT NOT NULL,
+            BrandID INT NOT NULL,
+            SkusObserved INT NOT NULL,
+            SkusOut INT NOT NULL,
+            AvailabilityPct DECIMAL(5, 2) NOT NULL,
+            OutMinutes INT NOT NULL,
+            AvgPrice DECIMAL(10, 2),
+            PRIMARY KEY (CountryID, BrandID, Day),
+            FOREIGN KEY (CountryID) REFERENCES Countries(CountryID),
+            FOREIGN KEY (BrandID) REFERENCES Brands(BrandID)
+        )
+        """)
+        # Refreshing a day reads only that day's rows
+        cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_ProductStatus_Date')
+        CREATE INDEX IX_ProductStatus_Date ON ProductStatus (Date)
+        INCLUDE (ProductID, CountryID, BrandID, Status, CurrentPrice)
+        """)
+        conn.commit()
+        # Backfill from the existing history once
+        days = pd.read_sql("""
+        SELECT DISTINCT CAST(ps.Date AS DATE) AS Day, c.CountryCode, b.BrandName
+        FROM ProductStatus ps
+        JOIN Countries c ON ps.CountryID = c.CountryID
+        JOIN Brands b ON ps.BrandID = b.BrandID
+        WHERE ps.Status IN ('IN', 'OUT')
+        """, conn)
+        days['Day'] = pd.to_datetime(days['Day'])
+        periods = (days['Day'] - days['Day'].min()).dt.days // BACKFILL_DAYS
+        for _, keys in days.groupby(periods):
+            _refresh_days(conn, keys)
+    cursor.close()
+
+
+def _stage_keys(cursor, keys):
+    cursor.execute("IF OBJECT_ID('tempdb..#RollupKeys') IS NOT NULL DROP TABLE #RollupKeys")
+    cursor.execute("""
+    CREATE TABLE #RollupKeys (
+        Day DATE,
+        CountryID INT,
+        BrandID INT,
+        PRIMARY KEY (CountryID, BrandID, Day)
+    )
+    """)
+    cursor.executemany("""
+    INSERT INTO #RollupKeys
+    SELECT %s, c.CountryID, b.BrandID
+    FROM Countries c, Brands b
+    WHERE c.CountryCode = %s AND b.BrandName = %s
+    """, [(day.date(), country, brand) for day, country, brand in keys[ROLLUP_KEY].itertuples(index=False)])
+
+
+def compute_daily_availability(observations, out_at_start, now=None):
+    """Rolls observations up per (Day, CountryCode, BrandName).
+
+    observations has ProductID, Day, CountryCode, BrandName, Date, Status and
+    Price per ProductStatus row; out_at_start has the ProductID and market
+    keys of SKUs that were out of stock when the day began.
+    """
+    now = now or datetime.now()
+    product_day = ROLLUP_KEY + ['ProductID']
+    obs = observations.sort_values(product_day + ['Date'])
+    # A status holds until the next observation, the end of the day or now
+    day_end = (obs['Day'] + pd.Timedelta(days=1)).clip(upper=pd.Timestamp(now))
+    until = obs.groupby(product_day)['Date'].shift(-1).fillna(day_end)
+    is_out = obs['Status'] == 'OUT'
+    obs = obs.assign(IsOut=is_out, OutMinutes=((until - obs['Date']).dt.total_seconds() / 60).where(is_out, 0.0))
+
+    first_seen = obs.groupby(product_day, as_index=False)['Date'].min()
+    carried = first_seen.merge(out_at_start, on=product_day)
+    carried_minutes = (carried['Date'] - carried['Day']).dt.total_seconds() / 60
+
+    per_product = obs.groupby(product_day).agg(
+        Out=('IsOut', 'max'),
+        OutMinutes=('OutMinutes', 'sum'),
+        Price=('Price', 'last'),
+    )
+    rollup = per_product.groupby(level=ROLLUP_KEY).agg(
+        SkusObserved=('Out', 'size'),
+        SkusOut=('Out', 'sum'),
+        OutMinutes=('OutMinutes', 'sum'),
+        AvgPrice=('Price', 'mean'),
+    )
+    rollup['OutMinutes'] = rollup['OutMinutes'].add(
+        carried_minutes.groupby([carried[k] for k in ROLLUP_KEY]).sum(), fill_value=0).round().astype(int)
+    rollup['SkusOut'] = rollup['SkusOut'].astype(int)
+    rollup['AvailabilityPct'] = (100 * (1 - rollup['SkusOut'] / rollup['SkusObserved'])).round(2)
+    return rollup.reset_index()
+
+
+def _refresh_days(conn, keys):
+    cursor = conn.cursor()
+    try:
+        _stage_keys(cursor, keys)
+        observations = pd.read_sql("""
+        SELECT ps.ProductID, k.Day, c.CountryCode, b.BrandName, ps.Date, ps.Status, ps.CurrentPrice AS Price
+        FROM #RollupKeys k
+        JOIN ProductStatus ps ON ps.CountryID = k.CountryID AND ps.BrandID = k.BrandID
+            AND ps.Date >= k.Day AND ps.Date < DATEADD(day, 1, k.Day)
+        JOIN Countries c ON k.CountryID = c.CountryID
+        JOIN Brands b ON k.BrandID = b.BrandID
+        WHERE ps.Status IN ('IN', 'OUT')
+        """, conn)
+        out_at_start = pd.read_sql("""
+        SELECT e.ProductID, k.Day, c.CountryCode, b.BrandName
+        FROM #RollupKeys k
+        JOIN Countries c ON k.CountryID = c.CountryID
+        JOIN Brands b ON k.BrandID = b.BrandID
+        CROSS APPLY (
+            SELECT ProductID, EventType,
+                   ROW_NUMBER() OVER (PARTITION BY ProductID ORDER BY EventDate DESC, EventID DESC) AS rn
+            FROM StockEvents
+            WHERE CountryID = k.CountryID AND BrandID = k.BrandID AND EventType IN ('IN', 'OUT')
+              AND EventDate < k.Day
+        ) e
+        WHERE e.rn = 1 AND e.EventType = 'OUT'
+        """, conn)
+        for df in (observations, out_at_start):
+            df['Day'] = pd.to_datetime(df['Day'])
+        observations['Date'] = pd.to_datetime(observations['Date'])
+        observations['Price'] = observations['Price'].astype(float)
+
+        rollup = compute_daily_availability(observations, out_at_start)
+        columns = ROLLUP_KEY + ['SkusObserved', 'SkusOut', 'AvailabilityPct', 'OutMinutes', 'AvgPrice']
+        rows = rollup[columns].assign(Day=rollup['Day'].dt.date).astype(object)
+        rows = rows.where(rows.notna(), None)
+
+        cursor.execute("IF OBJECT_ID('tempdb..#AvailabilityDaily') IS NOT NULL DROP TABLE #AvailabilityDaily")
+        cursor.execute("""
+        CREATE TABLE #AvailabilityDaily (
+            Day DATE,
+            CountryCode NVARCHAR(2),
+            BrandName NVARCHAR(50),
+            SkusObserved INT,
+            SkusOut INT,
+            AvailabilityPct DECIMAL(5, 2),
+            OutMinutes INT,
+            AvgPrice DECIMAL(10, 2)
+        )
+        """)
+        if not rows.empty:
+            cursor.executemany("INSERT INTO #AvailabilityDaily VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                               rows.values.tolist())
+        cursor.execute("""
+        MERGE INTO AvailabilityDaily AS target
+        USING (
+            SELECT a.Day, c.CountryID, b.BrandID, a.SkusObserved, a.SkusOut, a.AvailabilityPct, a.OutMinutes, a.AvgPrice
+            FROM #AvailabilityDaily a
+            JOIN Countries c ON c.CountryCode = a.CountryCode
+            JOIN Brands b ON b.BrandName = a.BrandName
+        ) AS source
+        ON target.Day = source.Day AND target.CountryID = source.CountryID AND target.BrandID = source.BrandID
+        WHEN MATCHED THEN
+            UPDATE SET SkusObserved = source.SkusObserved, SkusOut = source.SkusOut,
+                       AvailabilityPct = source.AvailabilityPct, OutMinutes = source.OutMinutes,
+                       AvgPrice = source.AvgPrice
+        WHEN NOT MATCHED THEN
+            INSERT (Day, CountryID, BrandID, SkusObserved, SkusOut, AvailabilityPct, OutMinutes, AvgPrice)
+            VALUES (source.Day, source.CountryID, source.BrandID, source.SkusObserved, source.SkusOut,
+                    source.AvailabilityPct, source.OutMinutes, source.AvgPrice);
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def refresh_daily_availability(conn, df):
+    """Recomputes the rollup for the days and markets of a saved scrape batch."""
+    run_once(ensure_availability_rollup, conn)
+    keys = pd.DataFrame({
+        'Day': pd.to_datetime(df['Date']).dt.normalize(),
+        'CountryCode': df['Country'],
+        'BrandName': df['Brand'],
+    }).drop_duplicates()
+    if not keys.empty:
+        _refresh_days(conn, keys)
+    return len(keys)
+
+
+def get_availability_trend(conn, days):
+    """Rollup rows of all markets for the last days days."""
+    query = """
+    SELECT a.Day, c.CountryCode AS Country, b.BrandName AS Brand, a.SkusObserved, a.SkusOut,
+           a.AvailabilityPct, a.OutMinutes, a.AvgPrice
+    FROM AvailabilityDaily a
+    JOIN Countries c ON a.CountryID = c.CountryID
+    JOIN Brands b ON a.BrandID = b.BrandID
+    WHERE a.Day >= %s
+    ORDER BY a.Day
+    """
+    df = pd.read_sql(query, conn, params=((datetime.now() - timedelta(days=days)).date(),))
+    df['Day'] = pd.to_datetime(df['Day'])
+    df[['AvailabilityPct', 'AvgPrice']] = df[['AvailabilityPct', 'AvgPrice']].astype(float)
+    return df
@@ -0,0 +1,135 @@
+"""Local HTTP server that serves product pages for the scraper benchmarks.
+
+The server acts as a plain HTTP proxy: the scraper requests the real shop URLs
+(over http://) with HTTP_PROXY pointing here, so the site registry, SKU rules
+and selectors behave as in production. The page served depends on the URL path
+/<case>/zid<SKU>, where case is one of CASES; with an archive directory, the
+archived page of the URL is served instead. Latency, slow responses and server
+errors are injected per request.
+"""
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'corpus')
+
+# Case -> share of the generated URLs
+CASES = {'in': 0.5, 'out': 0.35, 'no-price': 0.1, 'not-a-product': 0.05}
+
+# Shop host -> (language, brand); BE pages come in both languages
+MARKETS = {
+    'www.ninjakitchen.nl': ('nl', 'Ninja'),
+    'www.ninjakitchen.be': ('nl', 'Ninja'),
+    'www.ninjakitchen.fr': ('fr', 'Ninja'),
+    'www.sharkclean.nl': ('nl', 'Shark'),
+    'www.sharkclean.be': ('fr', 'Shark'),
+    'www.sharkclean.fr': ('fr', 'Shark'),
+}
+
+BUTTONS = {
+    ('nl', 'in'): '<button class="btn btn--primary js-add-to-cart" title="Toevoegen aan winkelmandje">In winkelmandje</button>',
+    ('nl', 'out'): '<button class="btn js-btn_out-of-stock" title="Niet op voorraad" disabled>Niet op voorraad</button>',
+    ('fr', 'in'): '<button class="btn btn--primary js-add-to-cart" title="Ajouter au panier">Ajouter au panier</button>',
+    ('fr', 'out'): '<button class="btn js-btn_out-of-stock" title="Stock épuisé" disabled>Stock épuisé</button>',
+}
+
+FILLER_BLOCK = ('<div class="tile"><a href="/p/{i}"><img src="/dw/image/v2/tile_{i}.jpg" alt="">'
+                '<span class="tile__name">Accessory {i}</span><span class="tile__price">{i},99 &euro;</span></a></div>\n')
+
+
+def build_urls(n, seed=0):
+    """n shop URLs spread over the markets and cases."""
+    rng = random.Random(seed)
+    hosts = list(MARKETS)
+    cases = rng.choices(list(CASES), weights=list(CASES.values()), k=n)
+    return [f"http://{hosts[i % len(hosts)]}/p/{case}/zidBM{i:05d}" for i, case in enumerate(cases)]
+
+
+def render_page(host, path, page_kb=150):
+    lang, brand = MARKETS.get(host, ('nl', 'Ninja'))
+    parts = path.strip('/').split('/')
+    case = parts[-2] if len(parts) >= 2 else 'not-a-product'
+    sku = parts[-1].replace('zid', '')
+    with open(os.path.join(CORPUS_DIR, 'product_page.html'), encoding='utf-8') as f:
+        template = f.read()
+    filler = ''
+    while len(filler) < page_kb * 1024:
+        filler += FILLER_BLOCK.format(i=len(filler) % 997)
+    page = template.format(
+        lang=lang, brand=brand, sku=sku, filler=filler,
+        name=f"{brand} Benchmark {sku}",
+        price_block='' if case == 'no-price' else '<div data-testing-id="current-price">1.299,99 €</div>',
+        button=BUTTONS[(lang, 'out' if case == 'out' else 'in')],
+    )
+    if case == 'not-a-product':
+        page = page.replace('js-product-title', 'page-title')
+    return page.encode('utf-8')
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=50, jitter_ms=20, slow_rate=0.0, slow_ms=1500, error_rate=0.0,
+                 page_kb=150, archive_dir=None, seed=0):
+        super().__init__(address, FixtureHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.page_kb = page_kb
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.pages = {}
+        if archive_dir:
+            from scraper.archive import HtmlArchive
+            source = HtmlArchive(archive_dir)
+            for entry, html in source.pages(source.entries()):
+                parts = urlsplit(entry.url)
+                self.pages[(parts.hostname, parts.path)] = html.encode('utf-8')
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections are not errors
+        pass
+
+    def page(self, url):
+        parts = urlsplit(url)
+        key = (parts.hostname, parts.path)
+        if key not in self.pages:
+            self.pages[key] = render_page(parts.hostname, parts.path, self.page_kb)
+        return self.pages[key]
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.rng_lock:
+            delay = server.latency_ms + server.rng.uniform(-server.jitter_ms, server.jitter_ms)
+            if server.rng.random() < server.slow_rate:
+                delay += server.slow_ms
+            failed = server.rng.random() < server.error_rate
+        time.sleep(max(delay, 0) / 1000)
+
+        # Proxied requests carry the absolute URL
+        url = self.path if self.path.startswith('http') else f"http://{self.headers['Host']}{self.path}"
+        body = b'Internal Server Error' if failed else server.page(url)
+        self.send_response(500 if failed else 200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port_queue, **options):
+    """Runs the server until its process is terminated, reporting the port first."""
+    server = FixtureServer(('127.0.0.1', 0), **options)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
@@ -0,0 +1,135 @@
+"""Import time of the Streamlit pages, from python -X importtime.
+
+    python -m benchmarks.import_bench --json before.json
+    python -m benchmarks.import_bench --compare before.json
+
+Runs the module-level imports of each page (imports inside functions and
+tabs are left out, as they only run when used) in a fresh interpreter:
+
+    cold  first start after a deploy, with no bytecode cache (compiles every module)
+    warm  a restarted App Service instance, with the bytecode cache in place
+
+Reports the best total import time of --repeat runs, the warm time beyond
+importing streamlit and pandas (which every page does), which of the heavy
+packages got imported and the slowest top-level imports. Streamlit's own
+reruns of a page do not import again, so this is the cost of the first load
+of each page per process. Run from the repository root.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from glob import glob
+
+import pandas as pd
+
+PAGES = ['streamlit_app.py'] + sorted(glob(os.path.join('pages', '*.py')))
+# plotly.graph_objects comes with streamlit itself, plotly.express does not
+HEAVY_PACKAGES = ('requests', 'bs4', 'plotly.express', 'urllib3', 'scraper')
+# Imported by every page; the time beyond this floor is the page's own
+FLOOR_IMPORTS = ['import streamlit', 'import pandas']
+
+
+def page_imports(path):
+    """Source of the import statements at the top level of a page."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def import_script(statements):
+    # A failing import (e.g. a missing optional dependency) should not hide the cost of the others
+    lines = []
+    for statement in statements:
+        lines += ['try:', f'    {statement}', 'except Exception as e:',
+                  f'    print("failed:", {statement!r}, repr(e))']
+    lines.append(f'import sys; print("loaded:", " ".join(m for m in {HEAVY_PACKAGES!r} if m in sys.modules))')
+    return '\n'.join(lines)
+
+
+def parse_importtime(stderr):
+    """(total microseconds, {top-level module: cumulative microseconds})."""
+    total, top_level = 0, {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        # Nesting is shown by indentation; two spaces of padding are always there
+        if not name[1:].startswith('  '):
+            top_level[name.strip()] = int(cumulative_us)
+    return total, top_level
+
+
+def run_once(statements, pycache_prefix):
+    path = os.pathsep.join(filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')]))
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_prefix, PYTHONPATH=path)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', import_script(statements)],
+                            capture_output=True, text=True, env=env)
+    total, top_level = parse_importtime(result.stderr)
+    loaded, failed = [], []
+    for line in result.stdout.splitlines():
+        if line.startswith('loaded:'):
+            loaded = line.split()[1:]
+        elif line.startswith('failed:'):
+            failed.append(line[len('failed: '):])
+    return total, top_level, loaded, failed
+
+
+def measure(path, repeat, floor=None):
+    statements = page_imports(path) if path else FLOOR_IMPORTS
+    cold, warm = [], []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix='import_bench_') as prefix:
+            total, _, _, _ = run_once(statements, prefix)
+            cold.append(total)
+            for _ in range(2):
+                total, top_level, loaded, failed = run_once(statements, prefix)
+            warm.append(total)
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:5]
+    # Noise only ever adds time, so the best run is the most repeatable
+    cold_ms, warm_ms = min(cold) / 1000, min(warm) / 1000
+    return {
+        'page': path or 'streamlit + pandas',
+        'cold_ms': round(cold_ms, 1),
+        'warm_ms': round(warm_ms, 1),
+        'own_warm_ms': round(warm_ms - floor['warm_ms'], 1) if floor else None,
+        'heavy_imports': ' '.join(loaded),
+        'slowest': ', '.join(f"{name} {us / 1000:.0f}ms" for name, us in slowest),
+        'failed': failed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time of the Streamlit pages")
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="results file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    floor = measure(None, args.repeat)
+    rows = [floor] + [measure(path, args.repeat, floor) for path in args.pages]
+    report = pd.DataFrame(rows).set_index('page')
+    if args.compare:
+        with open(args.compare) as f:
+            before = pd.DataFrame(json.load(f)['results']).set_index('page')
+        for column in ('cold_ms', 'warm_ms', 'own_warm_ms'):
+            report[f'{column}_saved'] = (before[column] - report[column]).round(1)
+    pd.set_option('display.max_colwidth', 80)
+    print(report.drop(columns=['slowest', 'failed']).to_string())
+    print()
+    print(report['slowest'].to_string())
+    for page, failed in report['failed'].items():
+        for failure in failed:
+            print(f"{page}: {failure}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'options': vars(args), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
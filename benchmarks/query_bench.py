@@ -0,0 +1,122 @@
+"""Dashboard and Price Tracking query benchmarks over synthetic history.
+
+    python -m benchmarks.query_bench --scales 100000 1000000 10000000 --repeat 5 --json before.json
+
+Each scale gets its own database (sn_bench_<rows>), filled once by
+benchmarks.synthetic_history and reused by later runs; see there for starting
+a local SQL Server. Every query runs once to warm the buffer pool and plan
+cache, then --repeat times. Reports median and p95 milliseconds, the rows
+returned and the memory of the result frame per query and scale, followed by
+the scaling exponent between consecutive scales: ~1 means the query grows
+linearly with the history, ~0 that it does not depend on it.
+"""
+import argparse
+import json
+import math
+import time
+
+import pandas as pd
+
+import db
+from benchmarks.synthetic_history import build, use_bench_server
+
+COUNTRY = 'NL'
+BRAND = 'Ninja'
+
+
+def queries():
+    import market_comparison
+    import stock_queries
+    from price_manager import PriceManager
+
+    def price_history():
+        manager = PriceManager()
+        return manager.get_price_history('SYN0000001', COUNTRY)
+
+    def comparison(cached):
+        def run():
+            if not cached:
+                market_comparison._cached = None
+            return market_comparison.get_comparison()
+        return run
+
+    return {
+        'get_dataframe_init': lambda: stock_queries.get_dataframe_init(COUNTRY, BRAND),
+        'get_current_out_of_stock': lambda: stock_queries.get_current_out_of_stock(COUNTRY, BRAND),
+        'get_out_of_stock_history': lambda: stock_queries.get_out_of_stock_history(COUNTRY, BRAND),
+        'read_from_db': lambda: stock_queries.read_from_db(COUNTRY, BRAND),
+        'get_price_history': price_history,
+        # Rebuilt after every write, served from the process otherwise
+        'build_comparison': comparison(cached=False),
+        'get_comparison_cached': comparison(cached=True),
+    }
+
+
+def time_query(func, repeat):
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    timings = pd.Series(timings) * 1000
+    return {
+        'median_ms': round(timings.median(), 1),
+        'p95_ms': round(timings.quantile(0.95), 1),
+        'rows': len(result),
+        'memory_kb': round(result.memory_usage(deep=True).sum() / 1024),
+    }
+
+
+def scaling_exponents(report):
+    """log(time ratio) / log(row ratio) between consecutive scales, per query."""
+    medians = report.pivot(index='scale', columns='query', values='median_ms').sort_index()
+    rows = []
+    for (small, a), (large, b) in zip(medians.iterrows(), list(medians.iterrows())[1:]):
+        exponents = {query: round(math.log(b[query] / a[query]) / math.log(large / small), 2)
+                     for query in medians.columns if a[query] > 0 and b[query] > 0}
+        rows.append({'scales': f"{small} -> {large}", **exponents})
+    return pd.DataFrame(rows).set_index('scales') if rows else pd.DataFrame()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard queries over synthetic history")
+    parser.add_argument('--scales', type=int, nargs='+', default=[100_000, 1_000_000],
+                        help="approximate ProductStatus rows per database")
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--scrapes-per-day', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help="run only these queries")
+    parser.add_argument('--statements', action='store_true', help="also print per-statement timings")
+    parser.add_argument('--json', help="write the results to this file for comparing runs")
+    args = parser.parse_args(argv)
+    use_bench_server()
+
+    rows = []
+    for scale in sorted(args.scales):
+        database = f"sn_bench_{scale}"
+        actual = build(database, scale, args.days, args.scrapes_per_day)
+        db.DB_NAME = database
+        db.reset_query_logs()
+        for name, func in queries().items():
+            if args.only and name not in args.only:
+                continue
+            rows.append({'scale': scale, 'history_rows': actual, 'query': name, **time_query(func, args.repeat)})
+            print(f"{database}: {name} {rows[-1]['median_ms']} ms")
+        if args.statements:
+            print(db.statement_stats()[['count', 'p50', 'p95', 'mean_rows']].to_string())
+
+    report = pd.DataFrame(rows)
+    print(report.pivot(index='query', columns='scale', values=['median_ms', 'p95_ms', 'rows', 'memory_kb']).to_string())
+    exponents = scaling_exponents(report)
+    if not exponents.empty:
+        print("\nScaling exponents (time ~ rows^k)")
+        print(exponents.T.to_string())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'options': vars(args), 'results': rows,
+                       'exponents': exponents.to_dict(orient='index')}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Scraper benchmarks against the local fixture server.
+
+    python -m benchmarks.scraper_bench --urls 200 --latency-ms 50 --error-rate 0.05 --json before.json
+
+Scenarios, each in a fresh process so peak RSS is its own:
+
+    parse               parse_product over the served pages, no network
+    check_availability  one call for all URLs
+    process_urls        the dashboard/worker path, one check per URL
+
+Reports URLs/s, p50/p95 latency per URL (where the scenario sees single URLs),
+CPU milliseconds per page of the scraper process and its peak RSS. Pass
+--archive to serve pages recorded with SCRAPE_ARCHIVE_DIR instead of the
+generated corpus. Run from the repository root.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pandas as pd
+
+from benchmarks.fixture_server import build_urls, serve
+
+SCENARIOS = ('parse', 'check_availability', 'process_urls')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile_ms(latencies, q):
+    return round(float(pd.Series(latencies).quantile(q)) * 1000, 1) if latencies else None
+
+
+def run_scenario(scenario, urls, proxy, results):
+    os.environ['HTTP_PROXY'] = proxy
+    os.environ.pop('NO_PROXY', None)
+    os.environ.pop('SCRAPE_ARCHIVE_DIR', None)
+    import requests
+    from scraper.core import check_availability, parse_product, process_urls
+    from scraper.sites import site_for_url
+
+    # Metrics exports land in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix='scraper_bench_'))
+    logging.disable(logging.WARNING)
+
+    outcomes = Counter()
+    latencies = []
+    if scenario == 'parse':
+        with requests.Session() as session:
+            pages = [(url, session.get(url).text) for url in urls]
+        cpu_start, start = time.process_time(), time.perf_counter()
+        for url, html in pages:
+            page_start = time.perf_counter()
+            outcome, _ = parse_product(html, url, site_for_url(url), '')
+            latencies.append(time.perf_counter() - page_start)
+            outcomes[outcome] += 1
+    elif scenario == 'check_availability':
+        cpu_start, start = time.process_time(), time.perf_counter()
+        out_of_stock, in_stock, skipped = check_availability(urls)
+        outcomes.update(OUT=len(out_of_stock), IN=len(in_stock), skipped=len(skipped))
+    else:
+        marks = []
+        cpu_start, start = time.process_time(), time.perf_counter()
+        out_of_stock, in_stock, skipped, _ = process_urls(
+            urls, progress=lambda index, total, skipped: marks.append(time.perf_counter()))
+        marks.append(time.perf_counter())
+        latencies = [b - a for a, b in zip(marks, marks[1:])]
+        outcomes.update(OUT=len(out_of_stock), IN=len(in_stock), skipped=len(skipped))
+    seconds = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    results.put({
+        'scenario': scenario,
+        'urls': len(urls),
+        'seconds': round(seconds, 3),
+        'urls_per_s': round(len(urls) / seconds, 1),
+        'p50_ms': _percentile_ms(latencies, 0.5),
+        'p95_ms': _percentile_ms(latencies, 0.95),
+        'cpu_ms_per_page': round(cpu / len(urls) * 1000, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1) if resource else None,
+        'outcomes': dict(outcomes),
+    })
+
+
+def wait_for_result(worker, results, poll_seconds=1):
+    """The row of the scenario, or None if its process exited without one."""
+    while True:
+        try:
+            return results.get(timeout=poll_seconds)
+        except queue.Empty:
+            if not worker.is_alive():
+                # A row put just before exiting can still be in the pipe
+                try:
+                    return results.get(timeout=poll_seconds)
+                except queue.Empty:
+                    return None
+
+
+def archived_urls(archive_dir):
+    from scraper.archive import HtmlArchive
+    # The fixture server is an HTTP proxy, so archived https pages are requested over http
+    return [urlunsplit(('http',) + tuple(urlsplit(url))[1:])
+            for url in HtmlArchive(archive_dir).entries()['url'].drop_duplicates()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local fixture server")
+    parser.add_argument('--urls', type=int, default=200, help="number of generated URLs")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--slow-rate', type=float, default=0.02, help="share of responses delayed by --slow-ms")
+    parser.add_argument('--slow-ms', type=float, default=1500)
+    parser.add_argument('--error-rate', type=float, default=0.02, help="share of responses failing with 500")
+    parser.add_argument('--page-kb', type=int, default=150, help="size of the generated pages")
+    parser.add_argument('--archive', help="serve pages from this archive directory instead")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the results to this file for comparing runs")
+    args = parser.parse_args(argv)
+
+    urls = archived_urls(args.archive) if args.archive else build_urls(args.urls, args.seed)
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    server = context.Process(target=serve, args=(port_queue,), daemon=True, kwargs=dict(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+        error_rate=args.error_rate, page_kb=args.page_kb, archive_dir=args.archive, seed=args.seed))
+    server.start()
+    proxy = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+    rows = []
+    try:
+        for scenario in args.scenarios:
+            results = context.Queue()
+            worker = context.Process(target=run_scenario, args=(scenario, urls, proxy, results))
+            worker.start()
+            row = wait_for_result(worker, results)
+            worker.join()
+            if row is None:
+                print(f"Scenario {scenario} failed: its process exited with code {worker.exitcode}")
+                row = {'scenario': scenario, 'error': f"exit code {worker.exitcode}", 'outcomes': {}}
+            rows.append(row)
+    finally:
+        server.terminate()
+
+    report = pd.DataFrame(rows).set_index('scenario')
+    print(report.drop(columns='outcomes').to_string())
+    print(report['outcomes'].to_string())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'options': vars(args), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""Synthetic stock and price history for benchmarking the dashboard queries.
+
+Fills a database with NL/BE/FR x Shark/Ninja products whose stock flaps in
+out-of-stock spells of a few days and whose price drops for promotion weeks,
+at any scale. Rows are generated set-based on the server, so tens of millions
+of ProductStatus rows take minutes, not hours. The server comes from
+BENCH_DB_HOST, BENCH_DB_USER and BENCH_DB_PASSWORD, never from the app's
+connection settings, and Azure SQL hosts are refused:
+
+    docker run -e ACCEPT_EULA=Y -e MSSQL_SA_PASSWORD=Bench-Passw0rd -p 1433:1433 -d \\
+        mcr.microsoft.com/mssql/server:2022-latest
+    export BENCH_DB_HOST=localhost BENCH_DB_USER=sa BENCH_DB_PASSWORD=Bench-Passw0rd
+    python -m benchmarks.synthetic_history --database sn_bench --rows 1000000
+"""
+import argparse
+import math
+import os
+import time
+
+import pymssql
+
+import db
+from availability_rollup import ensure_availability_rollup
+from price_index import ensure_lowest_price_index
+from stock_events import ensure_stock_events
+
+COUNTRIES = ('NL', 'BE', 'FR')
+BRANDS = ('Shark', 'Ninja')
+
+# Row source for set-based inserts, good for up to ~100M rows
+NUMBERS = """
+WITH n AS (
+    SELECT TOP ({count}) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) - 1 AS i
+    FROM sys.all_columns a CROSS JOIN sys.all_columns b
+)
+"""
+
+# Deterministic per product, country and week; a quarter of the weeks are promotions at 80%
+PRICE = """
+CAST((49.99 + ABS(CHECKSUM(p.ProductID, %(seed)s)) % 500)
+     * CASE WHEN ABS(CHECKSUM(p.ProductID, c.CountryID, %(day)s / 7, %(seed)s)) % 4 = 0 THEN 0.8 ELSE 1 END
+     AS DECIMAL(10, 2))
+"""
+
+
+BENCH_SETTINGS = {'DB_HOST': 'BENCH_DB_HOST', 'DB_USER': 'BENCH_DB_USER', 'DB_PASSWORD': 'BENCH_DB_PASSWORD'}
+
+
+def use_bench_server():
+    """Points db at the benchmark server; raises unless one is configured that is not production."""
+    missing = [name for name in BENCH_SETTINGS.values() if not os.environ.get(name)]
+    if missing:
+        raise RuntimeError(f"Set {', '.join(missing)} to a local benchmark server")
+    host = os.environ['BENCH_DB_HOST'].strip().lower()
+    # The benchmarks create, fill and drop databases
+    if host == db.PRODUCTION_DB_HOST or host.endswith('.database.windows.net'):
+        raise RuntimeError(f"Refusing to run benchmarks against {host}")
+    for setting, name in BENCH_SETTINGS.items():
+        setattr(db, setting, os.environ[name])
+
+
+def create_database(name):
+    use_bench_server()
+    conn = pymssql.connect(server=db.DB_HOST, user=db.DB_USER, password=db.DB_PASSWORD, database='master',
+                           autocommit=True)
+    try:
+        conn.cursor().execute(f"IF DB_ID('{name}') IS NULL CREATE DATABASE [{name}]")
+    finally:
+        conn.close()
+
+
+def drop_database(name):
+    use_bench_server()
+    conn = pymssql.connect(server=db.DB_HOST, user=db.DB_USER, password=db.DB_PASSWORD, database='master',
+                           autocommit=True)
+    try:
+        conn.cursor().execute(f"""
+        IF DB_ID('{name}') IS NOT NULL
+        BEGIN
+            ALTER DATABASE [{name}] SET SINGLE_USER WITH ROLLBACK IMMEDIATE;
+            DROP DATABASE [{name}];
+        END
+        """)
+    finally:
+        conn.close()
+
+
+def create_schema(conn):
+    from scraper.core import create_tables
+    create_tables()
+    # Prices is not created by the app; these are the columns it uses
+    cursor = conn.cursor()
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Prices' and xtype='U')
+    CREATE TABLE Prices (
+        PriceID INT IDENTITY(1,1) PRIMARY KEY,
+        ProductID INT NOT NULL,
+        CountryID INT NOT NULL,
+        Price DECIMAL(10, 2) NOT NULL,
+        EntryDate DATE NOT NULL,
+        Reason NVARCHAR(50),
+        UNIQUE (ProductID, CountryID, EntryDate),
+        FOREIGN KEY (ProductID) REFERENCES Products(ProductID),
+        FOREIGN KEY (CountryID) REFERENCES Countries(CountryID)
+    )
+    """)
+    conn.commit()
+
+
+def products_for_rows(rows, days, scrapes_per_day):
+    return max(1, math.ceil(rows / (len(COUNTRIES) * days * scrapes_per_day)))
+
+
+def generate(conn, products, days, scrapes_per_day=1, out_per_mille=150, spell_days=5, seed=0, progress=print):
+    """Adds products x countries x days x scrapes_per_day ProductStatus rows and weekly Prices rows."""
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO Countries (CountryCode) VALUES (%s)", [(c,) for c in COUNTRIES])
+    cursor.executemany("INSERT INTO Brands (BrandName) VALUES (%s)", [(b,) for b in BRANDS])
+    cursor.execute(NUMBERS.format(count=products) + """
+    INSERT INTO Products (SKU, ProductName)
+    SELECT CONCAT('SYN', FORMAT(i, '0000000')), CONCAT('Synthetic product ', i) FROM n
+    """)
+    conn.commit()
+
+    # Brand by ProductID parity; a SKU is OUT when its spell bucket hashes below out_per_mille
+    status_insert = NUMBERS.format(count=scrapes_per_day) + f"""
+    INSERT INTO ProductStatus (ProductID, CountryID, BrandID, Date, Status, Type, CurrentPrice)
+    SELECT
+        p.ProductID, c.CountryID, b.BrandID,
+        DATEADD(minute, s.i * (1440 / %(scrapes)s) + ABS(CHECKSUM(p.ProductID, s.i)) % 30,
+                CAST(DATEADD(day, %(day)s - %(days)s, CAST(GETDATE() AS DATE)) AS DATETIME)),
+        CASE WHEN ABS(CHECKSUM(p.ProductID, c.CountryID,
+                               (%(day)s + ABS(CHECKSUM(p.ProductID, c.CountryID)) % %(spell)s) / %(spell)s,
+                               %(seed)s)) % 1000 < %(out)s
+             THEN 'OUT' ELSE 'IN' END,
+        b.BrandName,
+        {PRICE}
+    FROM Products p
+    JOIN Brands b ON b.BrandName = CASE WHEN p.ProductID % 2 = 0 THEN 'Ninja' ELSE 'Shark' END
+    CROSS JOIN Countries c
+    CROSS JOIN n s
+    """
+    price_insert = f"""
+    INSERT INTO Prices (ProductID, CountryID, Price, EntryDate, Reason)
+    SELECT p.ProductID, c.CountryID, {PRICE}, DATEADD(day, %(day)s - %(days)s, CAST(GETDATE() AS DATE)), 'scraped'
+    FROM Products p
+    CROSS JOIN Countries c
+    """
+    start = time.perf_counter()
+    for day in range(days):
+        params = {'day': day, 'days': days, 'scrapes': scrapes_per_day, 'spell': spell_days,
+                  'out': out_per_mille, 'seed': seed}
+        cursor.execute(status_insert, params)
+        if day % 7 == 0:
+            cursor.execute(price_insert, params)
+        conn.commit()
+        if progress and (day + 1) % 30 == 0:
+            progress(f"  {day + 1}/{days} days ({time.perf_counter() - start:.0f}s)")
+
+
+def build_derived(conn):
+    """Backfills the tables the app maintains incrementally."""
+    ensure_stock_events(conn)
+    ensure_lowest_price_index(conn)
+    ensure_availability_rollup(conn)
+
+
+def build(database, rows, days=180, scrapes_per_day=1, seed=0, rebuild=False, progress=print):
+    """Creates and fills database for about rows ProductStatus rows, unless it is filled already."""
+    use_bench_server()
+    if rebuild:
+        drop_database(database)
+    create_database(database)
+    db.DB_NAME = database
+    conn = db.connect()
+    try:
+        create_schema(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT_BIG(*) FROM ProductStatus")
+        existing = cursor.fetchone()[0]
+        if existing:
+            return existing
+        products = products_for_rows(rows, days, scrapes_per_day)
+        progress(f"Generating {database}: {products} products x {len(COUNTRIES)} countries x {days} days "
+                 f"x {scrapes_per_day} scrapes")
+        generate(conn, products, days, scrapes_per_day, seed=seed, progress=progress)
+        progress("Backfilling StockEvents, PriceLowest30 and AvailabilityDaily")
+        build_derived(conn)
+        cursor.execute("SELECT COUNT_BIG(*) FROM ProductStatus")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill a local database with synthetic history")
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--rows', type=int, default=100_000, help="approximate ProductStatus rows")
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--scrapes-per-day', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rebuild', action='store_true', help="drop the database first")
+    args = parser.parse_args(argv)
+    rows = build(args.database, args.rows, args.days, args.scrapes_per_day, args.seed, args.rebuild)
+    print(f"{args.database}: {rows} ProductStatus rows")
+
+
+if __name__ == '__main__':
+    main()
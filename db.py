@@ -0,0 +1,246 @@
+"""Database access for all pages, with statement profiling.
+
+get_db_connection() returns a thin wrapper around the pymssql connection whose
+cursors time every statement, including fetching its rows, and record the
+calling function, row count and a hash of the parameters. The last
+QUERY_LOG_SIZE statements are kept in memory per process for percentiles, and
+statements slower than the threshold go to a separate slow-query log,
+optionally with their estimated SHOWPLAN XML. The Admin page shows both.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+import pymssql
+
+PRODUCTION_DB_HOST = 'stockscraper-server.database.windows.net'
+
+# Azure SQL Database connection parameters; the environment can point elsewhere
+DB_HOST = os.environ.get('DB_HOST', PRODUCTION_DB_HOST)
+DB_NAME = os.environ.get('DB_NAME', 'stockscraper-database')
+DB_USER = os.environ.get('DB_USER', 'stockscraper-server-admin')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', 'uc$DjSo7J6kqkoak')
+
+QUERY_LOG_SIZE = 5000
+SLOW_QUERY_LOG_SIZE = 200
+
+# Changed at runtime from the Admin page
+settings = {
+    'slow_query_seconds': float(os.environ.get('SLOW_QUERY_SECONDS', 1.0)),
+    'capture_plans': os.environ.get('CAPTURE_QUERY_PLANS') == '1',
+}
+
+_log_lock = threading.Lock()
+query_log = deque(maxlen=QUERY_LOG_SIZE)
+slow_query_log = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+# Called with every finished statement record, e.g. by the rerun profiler
+statement_listeners = []
+
+# Frames from these modules are skipped when looking for the calling function
+INTERNAL_MODULES = ('db', 'pandas', 'pymssql')
+
+
+def connect():
+    return pymssql.connect(server=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+
+
+# (database, function) pairs that run_once already ran in this process
+_ran_once = set()
+
+
+def run_once(fn, *args):
+    """Runs a schema check like ensure_stock_events(conn) once per database and process, not on every rerun."""
+    key = (DB_NAME, fn.__module__, fn.__qualname__)
+    if key not in _ran_once:
+        fn(*args)
+        _ran_once.add(key)
+
+
+def get_db_connection():
+    return ProfiledConnection(connect())
+
+
+def _caller():
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.split('.')[0] not in INTERNAL_MODULES:
+            return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+def normalize_statement(statement):
+    return re.sub(r'\s+', ' ', statement).strip()
+
+
+def hash_params(params):
+    if params is None:
+        return None
+    return hashlib.sha256(repr(params).encode()).hexdigest()[:12]
+
+
+class ProfiledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self):
+        return ProfiledCursor(self.conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+class ProfiledCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.pending = None
+        self.statement = None
+        self.params = None
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def _run(self, method, statement, params, batch_size=None):
+        self._finish()
+        record = {
+            'time': datetime.now(),
+            'started': time.perf_counter(),
+            'caller': _caller(),
+            'statement': normalize_statement(statement),
+            'params_hash': hash_params(params),
+            'batch_size': batch_size,
+            'seconds': 0.0,
+            'rows': 0,
+            'error': None,
+            'plan': None,
+        }
+        self.pending, self.statement, self.params = record, statement, params
+        start = time.perf_counter()
+        try:
+            if params is None:
+                result = method(statement)
+            else:
+                result = method(statement, params)
+        except Exception as e:
+            record['seconds'] = time.perf_counter() - start
+            record['error'] = str(e)
+            self._finish()
+            raise
+        record['seconds'] = time.perf_counter() - start
+        if self.cursor.description is None:
+            record['rows'] = max(self.cursor.rowcount, 0)
+            self._finish()
+        return result
+
+    def execute(self, statement, params=None):
+        return self._run(self.cursor.execute, statement, params)
+
+    def executemany(self, statement, params):
+        params = list(params)
+        return self._run(self.cursor.executemany, statement, params, batch_size=len(params))
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        rows = method(*args)
+        if self.pending is not None:
+            self.pending['seconds'] += time.perf_counter() - start
+        return rows
+
+    def fetchone(self):
+        row = self._fetch(self.cursor.fetchone)
+        if self.pending is not None:
+            if row is None:
+                self._finish()
+            else:
+                self.pending['rows'] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(self.cursor.fetchmany, size or self.cursor.arraysize)
+        if self.pending is not None:
+            self.pending['rows'] += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self.cursor.fetchall)
+        if self.pending is not None:
+            self.pending['rows'] += len(rows)
+            self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        self.cursor.close()
+
+    def _finish(self):
+        record, self.pending = self.pending, None
+        if record is None:
+            return
+        slow = record['seconds'] >= settings['slow_query_seconds']
+        if slow and settings['capture_plans'] and record['batch_size'] is None and record['error'] is None:
+            record['plan'] = capture_plan(self.statement, self.params)
+        with _log_lock:
+            query_log.append(record)
+            if slow:
+                slow_query_log.append(record)
+        for listener in statement_listeners:
+            listener(record)
+
+
+def capture_plan(statement, params):
+    """Returns the estimated plan XML of a statement without executing it.
+
+    Runs on a separate connection, so statements on temp tables of the
+    original session have no plan.
+    """
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            if params is None:
+                cursor.execute(statement)
+            else:
+                cursor.execute(statement, params)
+            return ''.join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+    except Exception as e:
+        return f"<!-- plan not available: {e} -->"
+    finally:
+        conn.close()
+
+
+def query_log_frame(slow_only=False):
+    with _log_lock:
+        records = list(slow_query_log if slow_only else query_log)
+    columns = ['time', 'caller', 'statement', 'params_hash', 'batch_size', 'seconds', 'rows', 'error', 'plan']
+    return pd.DataFrame(records, columns=columns)
+
+
+def statement_stats():
+    """Latency percentiles and row counts per calling function and statement."""
+    df = query_log_frame()
+    if df.empty:
+        return df
+    grouped = df.groupby(['caller', 'statement'])
+    stats = grouped['seconds'].describe(percentiles=[0.5, 0.95, 0.99])[['count', 'mean', '50%', '95%', '99%', 'max']]
+    stats['total'] = grouped['seconds'].sum()
+    stats['mean_rows'] = grouped['rows'].mean()
+    return stats.rename(columns={'50%': 'p50', '95%': 'p95', '99%': 'p99'}).sort_values('total', ascending=False)
+
+
+def reset_query_logs():
+    with _log_lock:
+        query_log.clear()
+        slow_query_log.clear()
@@ -0,0 +1,31 @@
+"""Compact column types for query results kept in the session.
+
+pd.read_sql returns text columns as Python strings and DECIMAL columns as
+decimal.Decimal objects, all in object columns of ~60-100 bytes per cell.
+Result frames repeat a handful of SKUs, statuses, countries and reasons on
+every row, so typed_frame stores those as categoricals, prices as float64
+rounded to cents, day counts as the smallest integer type that fits and
+dates as datetime64. The values compare and sort as before; editors that
+need free text should convert a categorical column back to object.
+"""
+import pandas as pd
+
+
+def typed_frame(df, categories=(), prices=(), counts=(), dates=()):
+    """Converts the named columns of df in place and returns it."""
+    for column in categories:
+        df[column] = df[column].astype('category')
+    for column in prices:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype(float).round(2)
+    for column in counts:
+        # Nullable counts stay float, as pandas has no NaN in numpy integers
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    for column in dates:
+        df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def flag_category(mask, if_true, if_false):
+    """Categorical of two labels from a boolean mask, without a Python call per row."""
+    codes = mask.to_numpy(dtype=bool).astype('int8')
+    return pd.Series(pd.Categorical.from_codes(codes, categories=[if_false, if_true]), index=mask.index)
@@ -0,0 +1,33 @@
+"""Lazily evaluated page sections.
+
+st.tabs runs the body of every tab on each rerun, so hidden tabs pay for
+their queries too. lazy_tabs renders the same choice as a horizontal radio
+and returns the open tab, so a page only runs that tab's body. session_memo
+keeps a section's query results in the session, so reopening a tab does not
+query again until the data is refreshed or written to.
+"""
+import time
+
+import streamlit as st
+
+MEMO_KEY = '_section_memo'
+MEMO_TTL_SECONDS = 600
+
+
+def lazy_tabs(labels, key):
+    return st.radio("View", labels, horizontal=True, key=key, label_visibility="collapsed")
+
+
+def session_memo(fn, *args, ttl=MEMO_TTL_SECONDS):
+    memo = st.session_state.setdefault(MEMO_KEY, {})
+    key = (fn.__module__, fn.__qualname__, args)
+    cached = memo.get(key)
+    if cached is None or time.time() - cached[0] > ttl:
+        cached = memo[key] = (time.time(), fn(*args))
+    # Callers get a copy, so adding columns for display never touches the memo
+    value = cached[1]
+    return value.copy() if hasattr(value, 'copy') else value
+
+
+def clear_session_memo():
+    st.session_state.pop(MEMO_KEY, None)
@@ -0,0 +1,98 @@
+"""Process-wide logging configuration.
+
+Streamlit re-executes page scripts on every rerun, but imported modules are
+loaded once per process, so setup_logging() only configures logging the first
+time it is called. Records are handed to a queue on the calling thread and
+written as JSON lines by a background listener, so a slow disk never stalls a
+page render or the scraper.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = 'LOGS'
+LOG_FILE = os.path.join(LOG_DIR, 'sharkninja.log')
+MAX_LOG_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 14
+
+# Per-logger levels; override with e.g. LOG_LEVELS="scraper=DEBUG,urllib3=INFO"
+LOG_LEVELS = {
+    '': 'INFO',
+    'scraper': 'INFO',
+    'scrape_metrics': 'WARNING',
+    'urllib3': 'WARNING',
+}
+
+_setup_lock = threading.Lock()
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotates at max_bytes or at midnight, whichever comes first."""
+
+    def __init__(self, filename, max_bytes, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.rollover_at = self.next_midnight()
+
+    @staticmethod
+    def next_midnight():
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self.next_midnight()
+
+
+def configured_levels():
+    levels = dict(LOG_LEVELS)
+    for item in os.environ.get('LOG_LEVELS', '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = SizeAndTimeRotatingFileHandler(LOG_FILE, MAX_LOG_BYTES, BACKUP_COUNT)
+        file_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        logging.getLogger().addHandler(QueueHandler(log_queue))
+
+        for name, level in configured_levels().items():
+            logging.getLogger(name or None).setLevel(level)
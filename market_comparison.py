@@ -0,0 +1,186 @@
+"""Status and prices of every SKU side by side across the markets.
+
+The comparison is built from one query per source: UrlIndex for the SKUs
+tracked per market and their brand, StockEvents for the current status and
+days out of stock, Prices for the current price and PriceLowest30 for the
+30-day low. The rows are pivoted to one row per SKU with a column per measure
+and country, e.g. "Price NL".
+
+The built matrix is kept per process until a source is written to. Every read
+first fetches a version token (the last stock event, the Prices write counter,
+the size and last update of UrlIndex and today's date, as days out of stock
+and the 30-day window move daily), which costs a few index lookups.
+Filtering and sorting run on the kept matrix, so only the rows shown are sent
+to the browser.
+"""
+import pandas as pd
+
+from db import get_db_connection, run_once
+from frame_types import typed_frame
+from price_index import ensure_lowest_price_index, get_lowest_prices
+from stock_events import ensure_stock_events
+
+KEY = ['SKU', 'Country']
+MEASURES = ['Status', 'Price', 'Low30', 'DaysOut']
+COUNTRY_ORDER = ['NL', 'BE', 'FR']
+SORT_COLUMNS = ['MarketsOut', 'PriceSpread', 'SKU']
+
+# (version token, matrix) of the last build in this process
+_cached = None
+
+
+def _has_url_index(cursor):
+    cursor.execute("SELECT OBJECT_ID('UrlIndex', 'U')")
+    return cursor.fetchone()[0] is not None
+
+
+def get_version(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT (SELECT MAX(EventID) FROM StockEvents), (SELECT Version FROM PriceWriteVersion), CAST(GETDATE() AS DATE)
+    """)
+    version = tuple(cursor.fetchone())
+    if _has_url_index(cursor):
+        cursor.execute("SELECT COUNT(*), MAX(UpdatedAt) FROM UrlIndex")
+        version += tuple(cursor.fetchone())
+    cursor.close()
+    return version
+
+
+def load_tracked_skus(conn):
+    cursor = conn.cursor()
+    # UrlIndex is created by the first scheduled scrape
+    exists = _has_url_index(cursor)
+    cursor.close()
+    if not exists:
+        return pd.DataFrame(columns=['SKU', 'Country', 'Brand'])
+    return pd.read_sql("""
+    SELECT DISTINCT SKU, CountryCode AS Country, BrandName AS Brand
+    FROM UrlIndex
+    WHERE SKU IS NOT NULL AND CountryCode IS NOT NULL
+    """, conn)
+
+
+def load_current_statuses(conn):
+    # The last IN/OUT event of a SKU is its current status; an OUT event starts the current streak
+    query = """
+    WITH last_status AS (
+        SELECT
+            e.ProductID,
+            e.CountryID,
+            e.BrandID,
+            e.EventDate,
+            e.EventType,
+            ROW_NUMBER() OVER (PARTITION BY e.ProductID, e.CountryID ORDER BY e.EventDate DESC, e.EventID DESC) AS rn
+        FROM StockEvents e
+        WHERE e.EventType IN ('IN', 'OUT')
+    )
+    SELECT
+        p.SKU,
+        c.CountryCode AS Country,
+        b.BrandName AS Brand,
+        s.EventType AS Status,
+        CASE WHEN s.EventType = 'OUT' THEN DATEDIFF(day, s.EventDate, GETDATE()) END AS DaysOut
+    FROM last_status s
+    JOIN Products p ON s.ProductID = p.ProductID
+    JOIN Countries c ON s.CountryID = c.CountryID
+    JOIN Brands b ON s.BrandID = b.BrandID
+    WHERE s.rn = 1
+    """
+    return pd.read_sql(query, conn)
+
+
+def load_current_prices(conn):
+    query = """
+    SELECT SKU, CountryCode AS Country, Price
+    FROM (
+        SELECT
+            pr.SKU,
+            c.CountryCode,
+            p.Price,
+            ROW_NUMBER() OVER (PARTITION BY p.ProductID, p.CountryID ORDER BY p.EntryDate DESC) AS rn
+        FROM Prices p
+        JOIN Products pr ON p.ProductID = pr.ProductID
+        JOIN Countries c ON p.CountryID = c.CountryID
+    ) latest
+    WHERE rn = 1
+    """
+    return pd.read_sql(query, conn)
+
+
+def build_comparison(conn):
+    """One row per SKU with Brand and a MEASURES column per country."""
+    tracked = load_tracked_skus(conn).drop_duplicates(KEY)
+    statuses = load_current_statuses(conn).drop_duplicates(KEY)
+    prices = load_current_prices(conn)
+    lowest = get_lowest_prices(conn).rename(columns={'country': 'Country', 'LowestPrice': 'Low30'})
+
+    rows = (tracked.merge(statuses, on=KEY, how='outer', suffixes=('', 'Event'))
+            .merge(prices, on=KEY, how='outer')
+            .merge(lowest[KEY + ['Low30']], on=KEY, how='outer'))
+    rows['Brand'] = rows['Brand'].fillna(rows.pop('BrandEvent'))
+    # Events only record changes, so a SKU that was never out of stock has none; a price shows it was scraped
+    rows['Status'] = rows['Status'].where(rows['Status'].notna() | rows['Price'].isna(), 'IN')
+
+    countries = sorted(rows['Country'].unique(),
+                       key=lambda c: (COUNTRY_ORDER.index(c) if c in COUNTRY_ORDER else len(COUNTRY_ORDER), c))
+    matrix = rows.pivot(index='SKU', columns='Country', values=MEASURES)
+    matrix = matrix.reindex(columns=pd.MultiIndex.from_product([MEASURES, countries]))
+    matrix.columns = [f"{measure} {country}" for measure, country in matrix.columns]
+    matrix.insert(0, 'Brand', rows.dropna(subset=['Brand']).groupby('SKU')['Brand'].first())
+    # Pivoting the measures together leaves them all object columns
+    columns = {measure: [f"{measure} {country}" for country in countries] for measure in MEASURES}
+    return typed_frame(matrix, categories=['Brand'] + columns['Status'], prices=columns['Price'] + columns['Low30'],
+                       counts=columns['DaysOut'])
+
+
+def get_comparison():
+    """The comparison matrix, rebuilt only when a source changed since the last build in this process.
+
+    The frame is shared between sessions; filter_comparison returns copies to display.
+    """
+    global _cached
+    conn = get_db_connection()
+    try:
+        run_once(ensure_stock_events, conn)
+        run_once(ensure_lowest_price_index, conn)
+        version = get_version(conn)
+        if _cached is None or _cached[0] != version:
+            _cached = (version, build_comparison(conn))
+    finally:
+        conn.close()
+    return _cached[1]
+
+
+def matrix_countries(matrix):
+    return [column.split(' ', 1)[1] for column in matrix.columns if column.startswith('Status ')]
+
+
+def filter_comparison(matrix, countries=None, brand=None, search='', out_only=False, sort_by='MarketsOut',
+                      ascending=False):
+    """The matching SKUs, sorted.
+
+    Only the columns of the given countries are kept. MarketsOut counts the
+    countries a SKU is out of stock in, PriceSpread is the difference between
+    its highest and lowest current price among them.
+    """
+    countries = countries or matrix_countries(matrix)
+    status = matrix[[f"Status {country}" for country in countries]]
+    price = matrix[[f"Price {country}" for country in countries]]
+
+    mask = pd.Series(True, index=matrix.index)
+    if brand:
+        mask &= matrix['Brand'] == brand
+    if search:
+        mask &= matrix.index.str.contains(search, case=False, regex=False)
+    out = status.eq('OUT')
+    if out_only:
+        mask &= out.any(axis=1)
+
+    columns = ['Brand'] + [f"{measure} {country}" for measure in MEASURES for country in countries]
+    df = matrix.loc[mask, columns].assign(
+        MarketsOut=out[mask].sum(axis=1),
+        PriceSpread=(price[mask].max(axis=1) - price[mask].min(axis=1)).round(2))
+    if sort_by == 'SKU':
+        return df.sort_index(ascending=ascending)
+    return df.sort_values(sort_by, ascending=ascending, na_position='last', kind='stable')
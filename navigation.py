@@ -3,6 +3,13 @@ from time import sleep
 from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit.source_util import get_pages
 
+# The sidebar below replaces Streamlit's page list
+HIDE_PAGE_NAV_CSS = """
+    <style>
+    [data-testid="stSidebarNav"] {display: none;}
+    </style>
+    """
+
 
 def get_current_page_name():
     ctx = get_script_run_ctx()
@@ -15,6 +22,7 @@ def get_current_page_name():
 
 
 def make_sidebar():
+    st.markdown(HIDE_PAGE_NAV_CSS, unsafe_allow_html=True)
     with st.sidebar:
         st.image("Daco_5669294.png")
         st.write("---")
@@ -22,9 +30,15 @@ def make_sidebar():
         if st.session_state.get("logged_in", False):
             st.page_link("pages/page1.py", label="Dashboard")
             st.page_link("pages/page2.py", label="Price Tracking")
+            st.page_link("pages/market_comparison.py", label="Market Comparison")
             st.page_link("pages/add_urls.py", label="Urls")
+            st.page_link("pages/scrape_metrics.py", label="Scrape Metrics")
+            st.page_link("pages/admin.py", label="Admin")
 
             st.write("")
+            # Copied to a plain session key so it survives page switches
+            st.session_state.profiling = st.toggle(
+                "Profile page reruns", value=st.session_state.get("profiling", False), key="profiling_toggle")
             st.write("")
 
             if st.button("Log out"):
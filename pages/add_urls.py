@@ -1,22 +1,12 @@
 import streamlit as st
 import pymssql
+from db import get_db_connection, run_once
 from navigation import make_sidebar
+from logging_setup import setup_logging
 import pandas as pd
 
+setup_logging()
 make_sidebar()
-st.markdown("""
-    <style>
-    [data-testid="stSidebarNav"] {display: none;}
-    </style>
-    """, unsafe_allow_html=True)
-# Database connection details
-DB_HOST = "stockscraper-server.database.windows.net"
-DB_NAME = "stockscraper-database"
-DB_USER = "stockscraper-server-admin"
-DB_PASSWORD = "uc$DjSo7J6kqkoak"
-
-def get_db_connection():
-    return pymssql.connect(server=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
 
 def setup_database():
     conn = get_db_connection()
@@ -79,8 +69,8 @@ def remove_url_from_database(url):
 def main():
     st.title("URL Database Manager")
 
-    # Ensure the database and table are set up
-    setup_database()
+    # Ensure the database and table are set up, once per process
+    run_once(setup_database)
 
     tab1, tab2 = st.tabs(["Add URLs", "Search and Remove URLs"])
 
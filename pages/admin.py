@@ -0,0 +1,80 @@
+import streamlit as st
+
+import db
+from logging_setup import setup_logging
+from navigation import make_sidebar
+from profiler import load_profiles
+
+st.set_page_config(layout="wide", page_title="Admin")
+setup_logging()
+make_sidebar()
+
+
+def main():
+    st.title("Query Profiler")
+    st.caption("Statements executed by this app instance since it started (last "
+               f"{db.QUERY_LOG_SIZE} statements).")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        db.settings['slow_query_seconds'] = st.number_input(
+            "Slow query threshold (s)", min_value=0.0, step=0.1, value=db.settings['slow_query_seconds'])
+    with col2:
+        db.settings['capture_plans'] = st.checkbox(
+            "Capture SHOWPLAN XML for slow queries", value=db.settings['capture_plans'])
+    with col3:
+        if st.button("Clear logs"):
+            db.reset_query_logs()
+            st.rerun()
+
+    tab1, tab2, tab3 = st.tabs(["Statements", "Slow Query Log", "Rerun Profiles"])
+
+    with tab1:
+        stats = db.statement_stats()
+        if stats.empty:
+            st.info("No statements recorded yet.")
+        else:
+            st.subheader("Time per function")
+            per_caller = stats.groupby(level='caller')['total'].sum().sort_values(ascending=False)
+            st.bar_chart(per_caller)
+            st.dataframe(stats.round(4), use_container_width=True)
+
+    with tab2:
+        slow_df = db.query_log_frame(slow_only=True)
+        if slow_df.empty:
+            st.info(f"No statements slower than {db.settings['slow_query_seconds']}s.")
+        else:
+            slow_df = slow_df.iloc[::-1].reset_index(drop=True)
+            st.dataframe(slow_df.drop(columns='plan'), use_container_width=True)
+
+            with_plan = slow_df[slow_df['plan'].notna()]
+            if not with_plan.empty:
+                selected = st.selectbox(
+                    "Show plan for:", with_plan.index,
+                    format_func=lambda i: f"{with_plan.at[i, 'time']:%H:%M:%S} {with_plan.at[i, 'caller']} "
+                                          f"({with_plan.at[i, 'seconds']:.2f}s)")
+                st.download_button("Download .sqlplan", with_plan.at[selected, 'plan'],
+                                   file_name="query.sqlplan", mime="application/xml")
+                st.code(with_plan.at[selected, 'plan'], language='xml')
+
+    with tab3:
+        profiles = load_profiles()
+        if profiles.empty:
+            st.info("No rerun profiles recorded yet. Switch on 'Profile page reruns' in the sidebar.")
+        else:
+            page = st.selectbox("Page:", sorted(profiles['page'].unique()))
+            kinds = st.multiselect("Span kinds:", ['page', 'section', 'query', 'render'], default=['page', 'section'])
+            selected = profiles[(profiles['page'] == page) & profiles['kind'].isin(kinds)]
+            # Versions in deploy order, newest last
+            versions = selected.groupby('version')['time'].min().sort_values().index[-5:]
+            medians = (selected[selected['version'].isin(versions)]
+                       .pivot_table(index='name', columns='version', values='seconds', aggfunc='median')
+                       .reindex(columns=versions))
+            st.write("Median seconds per span for the last deploys:")
+            st.dataframe(medians.round(3), use_container_width=True)
+            reruns = selected[selected['kind'] == 'page'].groupby('version')['seconds'].count()
+            st.caption(f"Reruns profiled per version: {', '.join(f'{v}: {n}' for v, n in reruns.items())}")
+
+
+if __name__ == "__main__":
+    main()
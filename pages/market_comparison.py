@@ -0,0 +1,62 @@
+from navigation import make_sidebar
+import streamlit as st
+from logging_setup import setup_logging
+from market_comparison import SORT_COLUMNS, filter_comparison, get_comparison, matrix_countries
+from profiler import dataframe, render_profile, span, start_profile
+
+st.set_page_config(layout="wide", page_title="Market Comparison")
+setup_logging()
+start_profile("Market Comparison")
+with span("Sidebar"):
+    make_sidebar()
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def main():
+    st.title("Market Comparison")
+
+    with span("Load"):
+        matrix = get_comparison()
+    if matrix.empty:
+        st.info("No stock events or prices recorded yet")
+        render_profile()
+        return
+    all_countries = matrix_countries(matrix)
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        countries = st.multiselect("Countries", all_countries, default=all_countries, key="comparison_countries")
+        brand = st.selectbox("Brand", [''] + list(matrix['Brand'].cat.categories), key="comparison_brand")
+    with col2:
+        search = st.text_input("SKU contains", key="comparison_search")
+        out_only = st.checkbox("Out of stock in any of these countries", key="comparison_out_only")
+    with col3:
+        sort_by = st.selectbox("Sort by", SORT_COLUMNS, key="comparison_sort")
+        ascending = st.radio("Order", ["Descending", "Ascending"], horizontal=True,
+                             key="comparison_order") == "Ascending"
+    with col4:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, key="comparison_page_size")
+
+    with span("Filter"):
+        matches = filter_comparison(matrix, countries, brand, search, out_only, sort_by, ascending)
+    pages = max((len(matches) - 1) // page_size + 1, 1)
+    # No key: a filter that changes the page count starts over at page 1
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
+    # Only the rows of the page are sent to the browser
+    df = matches.iloc[(page - 1) * page_size:page * page_size]
+
+    st.caption(f"{len(matches)} SKUs match, showing {len(df)}")
+    price_format = st.column_config.NumberColumn(format="€%.2f")
+    dataframe(
+        df,
+        column_config={column: price_format for column in df.columns
+                       if column.startswith(('Price', 'Low30'))},
+        use_container_width=True,
+    )
+
+    render_profile()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,42 @@
 from navigation import make_sidebar
 import streamlit as st
-import pymssql
 import pandas as pd
-import plotly.express as px
-from datetime import date, datetime
-import io
+from datetime import date
+from logging_setup import setup_logging
+from price_charts import MAX_CHART_POINTS, downsample
+from price_manager import PriceManager
+from profiler import data_editor, dataframe, plotly_chart, render_profile, span, start_profile
+from lazy_sections import clear_session_memo, lazy_tabs, session_memo
 
 st.set_page_config(layout="wide", page_title="SKU Price Manager")
-st.markdown("""
-    <style>
-    [data-testid="stSidebarNav"] {display: none;}
-    </style>
-    """, unsafe_allow_html=True)
-make_sidebar()
-
-# Database connection parameters
-DB_HOST = 'stockscraper-server.database.windows.net'
-DB_NAME = 'stockscraper-database'
-DB_USER = 'stockscraper-server-admin'
-DB_PASSWORD = 'uc$DjSo7J6kqkoak'
-
-class PriceManager:
-    def __init__(self):
-        self.conn = pymssql.connect(server=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
-        self.cursor = self.conn.cursor()
-
-    def upsert_price(self, sku, price, entry_date, reason, country):
-        # Get ProductID and CountryID
-        self.cursor.execute("SELECT ProductID FROM Products WHERE SKU = %s", (sku,))
-        product_id = self.cursor.fetchone()
-        if not product_id:
-            self.cursor.execute("INSERT INTO Products (SKU, ProductName) VALUES (%s, %s)", (sku, f"Product {sku}"))
-            product_id = self.cursor.lastrowid
-        else:
-            product_id = product_id[0]
-
-        self.cursor.execute("SELECT CountryID FROM Countries WHERE CountryCode = %s", (country,))
-        country_id = self.cursor.fetchone()
-        if not country_id:
-            self.cursor.execute("INSERT INTO Countries (CountryCode) VALUES (%s)", (country,))
-            country_id = self.cursor.lastrowid
-        else:
-            country_id = country_id[0]
-
-        # Insert or update price
-        self.cursor.execute('''
-            MERGE INTO Prices AS target
-            USING (VALUES (%s, %s, %s, %s, %s)) AS source (ProductID, CountryID, Price, EntryDate, Reason)
-            ON target.ProductID = source.ProductID AND target.CountryID = source.CountryID AND target.EntryDate = source.EntryDate
-            WHEN MATCHED THEN
-                UPDATE SET Price = source.Price, Reason = source.Reason
-            WHEN NOT MATCHED THEN
-                INSERT (ProductID, CountryID, Price, EntryDate, Reason)
-                VALUES (source.ProductID, source.CountryID, source.Price, source.EntryDate, source.Reason)
-        ''', (product_id, country_id, price, entry_date, reason))
-        self.conn.commit()
-
-    def get_price_history(self, sku, country=None, days=None):
-        query = '''
-            SELECT p.EntryDate, p.Price, p.Reason, c.CountryCode as country 
-            FROM Prices p
-            JOIN Products pr ON p.ProductID = pr.ProductID
-            JOIN Countries c ON p.CountryID = c.CountryID
-            WHERE pr.SKU = %s
-        '''
-        params = [sku]
-        if country:
-            query += " AND c.CountryCode = %s"
-            params.append(country)
-        if days:
-            query += f" AND p.EntryDate >= DATEADD(day, -{days}, GETDATE())"
-        query += " ORDER BY p.EntryDate DESC"
-        return pd.read_sql(query, self.conn, params=params)
-
-    def delete_entry(self, sku, entry_date, country):
-        self.cursor.execute('''
-            DELETE FROM Prices 
-            WHERE ProductID = (SELECT ProductID FROM Products WHERE SKU = %s)
-            AND CountryID = (SELECT CountryID FROM Countries WHERE CountryCode = %s)
-            AND EntryDate = %s
-        ''', (sku, country, entry_date))
-        self.conn.commit()
-        return self.cursor.rowcount
-
-    def search_skus(self, term):
-        return pd.read_sql("SELECT DISTINCT SKU FROM Products WHERE SKU LIKE %s",
-                           self.conn, params=(f'%{term}%',))['SKU'].tolist()
-
-    def export_data(self):
-        query = '''
-            SELECT pr.SKU, p.Price, p.EntryDate, p.Reason, c.CountryCode as Country
-            FROM Prices p
-            JOIN Products pr ON p.ProductID = pr.ProductID
-            JOIN Countries c ON p.CountryID = c.CountryID
-        '''
-        df = pd.read_sql(query, self.conn)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Prices')
-        return output.getvalue()
-
-    def get_price_changes_by_date(self, search_date, country):
-        query = '''
-            SELECT pr.SKU, p.Price, p.Reason
-            FROM Prices p
-            JOIN Products pr ON p.ProductID = pr.ProductID
-            JOIN Countries c ON p.CountryID = c.CountryID
-            WHERE p.EntryDate = %s AND c.CountryCode = %s
-        '''
-        return pd.read_sql(query, self.conn, params=(search_date, country))
-
-    def __del__(self):
-        self.conn.close()
+setup_logging()
+start_profile("Price Tracking")
+with span("Sidebar"):
+    make_sidebar()
+
+# Accepted spellings of the bulk import sheet headers
+IMPORT_COLUMNS = {
+    'sku': 'SKU',
+    'country': 'Country',
+    'countrycode': 'Country',
+    'date': 'EntryDate',
+    'entrydate': 'EntryDate',
+    'price': 'Price',
+    'reason': 'Reason',
+}
+
+def read_price_sheet(uploaded_file):
+    if uploaded_file.name.lower().endswith('.csv'):
+        # sep=None sniffs ';' as well, which Excel uses for CSV in NL/BE/FR locales
+        df = pd.read_csv(uploaded_file, sep=None, engine='python', dtype=str)
+    else:
+        # dtype=object keeps SKUs as typed and date cells as datetimes
+        df = pd.read_excel(uploaded_file, dtype=object)
+    return df.rename(columns=lambda c: IMPORT_COLUMNS.get(str(c).strip().lower().replace(' ', ''), c))
 
 def main():
-    pm = PriceManager()
+    with span("Connect"):
+        pm = PriceManager()
 
     st.title('SKU Price Manager')
 
@@ -131,126 +53,259 @@ def main():
             )
 
     with col2:
-        tab1, tab2, tab3, tab4 = st.tabs(
-            ["Manage Prices", "Price History", "Search by Date", "Delete Entries"])
+        # Only the open tab runs its queries
+        active_tab = lazy_tabs(
+            ["Manage Prices", "Price History", "Compare Prices", "Lowest Prices", "Search by Date", "Edit Entries",
+             "Bulk Import"], key="prices_tab")
 
-        with tab1:
-            st.subheader("Manage Prices")
+        if active_tab == "Manage Prices":
+            with span("Manage Prices"):
+                st.subheader("Manage Prices")
         
-            # Initialize session state
-            if 'adding_new_sku' not in st.session_state:
-                st.session_state.adding_new_sku = False
+                # Initialize session state
+                if 'adding_new_sku' not in st.session_state:
+                    st.session_state.adding_new_sku = False
         
-            # Button to toggle between adding new SKU and selecting existing SKU
-            if st.button('Add New SKU' if not st.session_state.adding_new_sku else 'Select Existing SKU'):
-                st.session_state.adding_new_sku = not st.session_state.adding_new_sku
+                # Button to toggle between adding new SKU and selecting existing SKU
+                if st.button('Add New SKU' if not st.session_state.adding_new_sku else 'Select Existing SKU'):
+                    st.session_state.adding_new_sku = not st.session_state.adding_new_sku
         
-            # Display either selectbox or text input based on state
-            if st.session_state.adding_new_sku:
-                sku = st.text_input('Enter new SKU:', key='new_sku_input')
-            else:
-                sku = st.selectbox('Select SKU:', [''] + pm.search_skus(''), key='manage_sku')
+                # Display either selectbox or text input based on state
+                if st.session_state.adding_new_sku:
+                    sku = st.text_input('Enter new SKU:', key='new_sku_input')
+                else:
+                    sku = st.selectbox('Select SKU:', [''] + session_memo(pm.search_skus, ''), key='manage_sku')
         
-            price = st.number_input('Price (€):', min_value=0.0, format='%.2f')
-            reason = st.text_input('Reason for change:')
-            entry_date = st.date_input("Date:", value=date.today())
+                price = st.number_input('Price (€):', min_value=0.0, format='%.2f')
+                reason = st.text_input('Reason for change:')
+                entry_date = st.date_input("Date:", value=date.today())
         
-            if st.button('Submit'):
-                if sku and price and reason:
-                    pm.upsert_price(sku, price, entry_date, reason, country)
-                    st.success(f'Price updated for SKU {sku}: €{price:.2f} on {entry_date}')
-                    # Reset to selectbox mode after successful submission
-                    st.session_state.adding_new_sku = False
-                    st.rerun()
-                else:
-                    st.error('Please fill all fields.')
+                if st.button('Submit'):
+                    if sku and price and reason:
+                        pm.upsert_price(sku, price, entry_date, reason, country)
+                        st.success(f'Price updated for SKU {sku}: €{price:.2f} on {entry_date}')
+                        # Reset to selectbox mode after successful submission
+                        st.session_state.adding_new_sku = False
+                        clear_session_memo()
+                        st.rerun()
+                    else:
+                        st.error('Please fill all fields.')
 
-        with tab2:
-            st.subheader("Price History")
+        elif active_tab == "Price History":
+            with span("Price History"):
+                st.subheader("Price History")
 
-            col1, col2 = st.columns([1, 2])
+                col1, col2 = st.columns([1, 2])
 
-            with col1:
-                lookup_sku = st.selectbox('Select or Enter SKU:', [''] + pm.search_skus(''), key='history_sku')
-                show_all = st.checkbox("Show all countries")
+                with col1:
+                    lookup_sku = st.selectbox('Select or Enter SKU:', [''] + session_memo(pm.search_skus, ''), key='history_sku')
+                    show_all = st.checkbox("Show all countries")
 
-            if lookup_sku:
-                df = pm.get_price_history(lookup_sku, None if show_all else country)
-                df_30_days = pm.get_price_history(lookup_sku, None if show_all else country, days=30)
+                if lookup_sku:
+                    # plotly is only needed for the charts, so the other tabs load without it
+                    import plotly.express as px
 
-                if not df.empty:
-                    with col2:
-                        if not df_30_days.empty:
-                            lowest_price_30_days = df_30_days['Price'].min()
-                            st.metric("Lowest price (last 30 days)", f"€{lowest_price_30_days:.2f}")
+                    df = pm.get_price_history(lookup_sku, None if show_all else country)
+                    df_lowest = pm.get_lowest_prices(None if show_all else country, [lookup_sku])
 
-                    st.plotly_chart(
-                        px.line(df, x='EntryDate', y='Price', color='country' if show_all else None,
-                                title=f'Price History for {lookup_sku}')
-                        .update_layout(yaxis_title='Price (€)', xaxis_title='Date'),
-                        use_container_width=True
-                    )
+                    if not df.empty:
+                        with col2:
+                            if not df_lowest.empty:
+                                lowest_price_30_days = df_lowest['LowestPrice'].min()
+                                st.metric("Lowest price (last 30 days)", f"€{lowest_price_30_days:.2f}")
+
+                        chart_df = downsample(df.assign(Price=df['Price'].astype(float)), series=('country',))
+                        plotly_chart(
+                            px.line(chart_df, x='EntryDate', y='Price', color='country' if show_all else None,
+                                    title=f'Price History for {lookup_sku}')
+                            .update_layout(yaxis_title='Price (€)', xaxis_title='Date'),
+                            use_container_width=True
+                        )
 
-                    st.dataframe(
-                        df.style.format({'Price': '€{:.2f}'})
-                           .set_properties(**{'text-align': 'left'}),
+                        dataframe(
+                            df.style.format({'Price': '€{:.2f}'})
+                               .set_properties(**{'text-align': 'left'}),
+                            use_container_width=True
+                        )
+                    else:
+                        st.info(f"No price history found for {lookup_sku}")
+
+        elif active_tab == "Compare Prices":
+            with span("Compare Prices"):
+                st.subheader("Compare Prices")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    compare_brand = st.selectbox('All SKUs of brand:', [''] + session_memo(pm.get_brands), key='compare_brand')
+                    compare_skus = st.multiselect('Or select SKUs:', session_memo(pm.search_skus, ''), key='compare_skus',
+                                                  disabled=bool(compare_brand))
+                with col2:
+                    compare_countries = st.multiselect('Countries:', ["NL", "BE", "FR"], default=[country],
+                                                       key='compare_countries')
+
+                if compare_brand or compare_skus:
+                    df_series = pm.get_price_series(None if compare_brand else compare_skus, compare_brand or None,
+                                                    compare_countries)
+                    if not df_series.empty:
+                        import plotly.express as px
+
+                        chart_df = downsample(df_series)
+                        chart_df = chart_df.assign(Series=chart_df['SKU'] + ' (' + chart_df['country'] + ')')
+                        plotly_chart(
+                            px.line(chart_df, x='EntryDate', y='Price', color='Series',
+                                    title=f"Price comparison for {compare_brand or ', '.join(compare_skus)}")
+                            .update_layout(yaxis_title='Price (€)', xaxis_title='Date'),
+                            use_container_width=True
+                        )
+                        if len(chart_df) < len(df_series):
+                            st.caption(f"Showing {len(chart_df)} of {len(df_series)} price points "
+                                       f"(downsampled to {MAX_CHART_POINTS})")
+                    else:
+                        st.info("No price history found for this selection")
+
+        elif active_tab == "Lowest Prices":
+            with span("Lowest Prices"):
+                st.subheader("Lowest Prices (last 30 days)")
+                show_all_lowest = st.checkbox("Show all countries", key='lowest_all_countries')
+                df_lowest = pm.get_lowest_prices(None if show_all_lowest else country)
+                if not df_lowest.empty:
+                    dataframe(
+                        df_lowest.style.format({'LowestPrice': '€{:.2f}'}),
+                        column_config={
+                            "LowestPrice": "Lowest price (€)",
+                            "LowestPriceDate": st.column_config.DateColumn("Lowest price date"),
+                        },
+                        hide_index=True,
                         use_container_width=True
                     )
                 else:
-                    st.info(f"No price history found for {lookup_sku}")
-
-        with tab3:
-            st.subheader("Search by Date")
-            search_date = st.date_input(
-                "Select date to search for price changes:", key='search_date')
-
-            if st.button('Search Price Changes'):
-                changes_df = pm.get_price_changes_by_date(search_date, country)
-                if not changes_df.empty:
-                    st.write(f"Price changes on {search_date}:")
-                    st.dataframe(changes_df.style.format({'Price': '€{:.2f}'}))
-                else:
-                    st.info(f"No price changes found on {search_date}")
+                    st.info("No prices recorded in the last 30 days")
+
+        elif active_tab == "Search by Date":
+            with span("Search by Date"):
+                st.subheader("Search by Date")
+                search_date = st.date_input(
+                    "Select date to search for price changes:", key='search_date')
+
+                if st.button('Search Price Changes'):
+                    changes_df = pm.get_price_changes_by_date(search_date, country)
+                    if not changes_df.empty:
+                        st.write(f"Price changes on {search_date}:")
+                        dataframe(changes_df.style.format({'Price': '€{:.2f}'}))
+                    else:
+                        st.info(f"No price changes found on {search_date}")
+
+        elif active_tab == "Edit Entries":
+            with span("Edit Entries"):
+                st.subheader("Edit Entries")
 
-        with tab4:
-            st.subheader("Delete Entries")
-            del_sku = st.selectbox('Select SKU:', [''] + pm.search_skus(''), key='delete_sku')
+                # Outcomes of the last edit survive the rerun that reloads the entries
+                if 'edit_outcomes' in st.session_state:
+                    outcomes = st.session_state.pop('edit_outcomes')
+                    st.success(f"Applied {(outcomes['Outcome'] != 'NOT FOUND').sum()} of {len(outcomes)} changes")
+                    if (outcomes['Outcome'] == 'NOT FOUND').any():
+                        st.warning("Some entries no longer existed:")
+                        dataframe(outcomes[outcomes['Outcome'] == 'NOT FOUND'], hide_index=True)
+
+                del_sku = st.selectbox('Select SKU:', [''] + session_memo(pm.search_skus, ''), key='delete_sku')
         
-            if del_sku:
-                df = pm.get_price_history(del_sku, country)
-                if not df.empty:
-                    st.write(f"Current entries for {del_sku} in {country}:")
+                if del_sku:
+                    # Reason is free text in the editor, not a choice of the existing reasons
+                    df = pm.get_price_history(del_sku, country).astype({'Reason': object})
+                    if not df.empty:
+                        st.write(f"Current entries for {del_sku} in {country}:")
         
-                    # Add the 'delete' column
-                    df['delete'] = False
+                        # Add the 'delete' column
+                        df['delete'] = False
         
-                    # Use st.data_editor for inline editing and row selection
-                    edited_df = st.data_editor(
-                        df,
-                        hide_index=True,
-                        column_config={
-                            "EntryDate": st.column_config.DateColumn("Date"),
-                            "Price": st.column_config.NumberColumn("Price (€)", format="€%.2f"),
-                            "Reason": "Reason",
-                            "delete": st.column_config.CheckboxColumn("Delete?")
-                        },
-                        disabled=["EntryDate", "Price", "Reason"],
-                        key="editor"
-                    )
+                        # Use st.data_editor for inline editing and row selection
+                        edited_df = data_editor(
+                            df,
+                            hide_index=True,
+                            column_config={
+                                "EntryDate": st.column_config.DateColumn("Date"),
+                                "Price": st.column_config.NumberColumn("Price (€)", format="€%.2f", min_value=0.01),
+                                "Reason": "Reason",
+                                "delete": st.column_config.CheckboxColumn("Delete?")
+                            },
+                            disabled=["EntryDate", "country"],
+                            key="editor"
+                        )
         
-                    # Filter rows marked for deletion
-                    rows_to_delete = edited_df[edited_df['delete'] == True]
+                        # Rows marked for deletion, and rows whose price or reason was edited
+                        rows_to_delete = edited_df[edited_df['delete'] == True]
+                        edited = ((edited_df['Price'].astype(float).round(2) != df['Price'].astype(float).round(2))
+                                  | (edited_df['Reason'].fillna('') != df['Reason'].fillna('')))
+                        rows_to_update = edited_df[edited & (edited_df['delete'] == False)]
         
-                    if not rows_to_delete.empty:
-                        if st.button("Delete Selected Entries"):
-                            for _, row in rows_to_delete.iterrows():
-                                pm.delete_entry(del_sku, row['EntryDate'], country)
-                            st.success(f"Deleted {len(rows_to_delete)} entries for SKU {del_sku}")
-                            st.rerun()
+                        if not rows_to_delete.empty or not rows_to_update.empty:
+                            if st.button(f"Apply Changes ({len(rows_to_delete)} deletes, {len(rows_to_update)} updates)"):
+                                st.session_state.edit_outcomes = pm.apply_price_edits(
+                                    deletes=[(del_sku, country, entry_date) for entry_date in rows_to_delete['EntryDate']],
+                                    updates=rows_to_update.assign(SKU=del_sku, Country=country)
+                                )
+                                clear_session_memo()
+                                st.rerun()
+                        else:
+                            st.info("Edit a price or reason, or select entries to delete by checking the 'Delete?' column")
                     else:
-                        st.info("Select entries to delete by checking the 'Delete?' column")
-                else:
-                    st.info(f"No entries found for SKU {del_sku} in {country}")
+                        st.info(f"No entries found for SKU {del_sku} in {country}")
+
+        elif active_tab == "Bulk Import":
+            with span("Bulk Import"):
+                st.subheader("Bulk Import")
+                uploaded_file = st.file_uploader(
+                    "Upload a price sheet with SKU, Price, Date and optional Country/Reason columns:",
+                    type=['csv', 'xlsx'])
+                default_reason = st.text_input('Reason for rows without one:', value='Bulk import', key='import_reason')
+
+                if uploaded_file:
+                    try:
+                        checked_df = pm.validate_price_import(read_price_sheet(uploaded_file), country, default_reason)
+                    except (ValueError, ImportError) as e:
+                        # ImportError: .xlsx sheets need openpyxl
+                        st.error(str(e))
+                        checked_df = None
+
+                    if checked_df is not None:
+                        valid_df = checked_df[checked_df['Error'] == '']
+                        invalid_df = checked_df[checked_df['Error'] != '']
+
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("Rows", len(checked_df))
+                        with col2:
+                            st.metric("Valid", len(valid_df))
+                        with col3:
+                            st.metric("Rejected", len(invalid_df))
+
+                        if not invalid_df.empty:
+                            st.write("Rejected rows:")
+                            dataframe(invalid_df, hide_index=True, use_container_width=True)
+
+                        if not valid_df.empty:
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                preview = st.button('Preview Import')
+                            with col2:
+                                apply = st.button('Apply Import', type='primary')
+
+                            if preview or apply:
+                                results_df = pm.bulk_upsert_prices(valid_df, dry_run=preview)
+                                counts = results_df['Action'].value_counts()
+                                summary = ", ".join(f"{counts.get(a, 0)} {a.lower()}" for a in ['INSERT', 'UPDATE', 'UNCHANGED'])
+                                if preview:
+                                    st.info(f"Dry run, nothing was saved: {summary}")
+                                else:
+                                    clear_session_memo()
+                                    st.success(f"Imported {len(results_df)} rows: {summary}")
+                                dataframe(
+                                    results_df.style.format({'Price': '€{:.2f}', 'PreviousPrice': '€{:.2f}'}, na_rep=''),
+                                    hide_index=True,
+                                    use_container_width=True
+                                )
+
+    render_profile()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,88 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from logging_setup import setup_logging
+from navigation import make_sidebar
+from scrape_metrics import METRICS_FILE, OUTCOMES, histogram_quantile, read_prometheus
+
+st.set_page_config(layout="wide", page_title="Scrape Metrics")
+setup_logging()
+make_sidebar()
+
+# Phases of a fetch, in request order; server time and download are derived
+PHASES = ['DNS', 'Connect', 'Server', 'Download', 'Parse']
+
+
+def mean_by_group(samples, name):
+    sums = samples[samples['metric'] == f'{name}_sum'].set_index(['country', 'brand'])['value']
+    counts = samples[samples['metric'] == f'{name}_count'].set_index(['country', 'brand'])['value']
+    return sums / counts.where(counts > 0)
+
+
+def main():
+    st.title("Scrape Metrics")
+
+    if not os.path.exists(METRICS_FILE):
+        st.info("No scrape metrics exported yet. They are written at the end of every scrape run.")
+        return
+
+    st.caption(f"Exported {datetime.fromtimestamp(os.path.getmtime(METRICS_FILE)):%d-%m-%Y %H:%M:%S}")
+    samples = read_prometheus()
+
+    requests_df = samples[samples['metric'] == 'scrape_requests_total']
+    outcomes = requests_df.pivot_table(index=['country', 'brand'], columns='outcome', values='value',
+                                       aggfunc='sum', fill_value=0)
+    outcomes = outcomes.reindex(columns=list(OUTCOMES), fill_value=0).astype(int)
+
+    timing = pd.DataFrame({
+        'DNS': mean_by_group(samples, 'scrape_dns_seconds'),
+        'Connect': mean_by_group(samples, 'scrape_connect_seconds'),
+        'TTFB': mean_by_group(samples, 'scrape_ttfb_seconds'),
+        'Total': mean_by_group(samples, 'scrape_total_seconds'),
+        'Parse': mean_by_group(samples, 'scrape_parse_seconds'),
+        'Bytes': mean_by_group(samples, 'scrape_response_bytes'),
+    })
+    timing['Server'] = (timing['TTFB'] - timing['DNS'] - timing['Connect']).clip(lower=0)
+    timing['Download'] = (timing['Total'] - timing['TTFB']).clip(lower=0)
+
+    total_buckets = samples[samples['metric'] == 'scrape_total_seconds_bucket']
+    if not total_buckets.empty:
+        timing['p50 Total'] = histogram_quantile(total_buckets, 0.5)
+        timing['p95 Total'] = histogram_quantile(total_buckets, 0.95)
+
+    st.subheader("Outcomes per group")
+    st.dataframe(outcomes.join(timing[['Total', 'Bytes']].round(3), how='left'), use_container_width=True)
+
+    if not timing.empty:
+        st.subheader("Where scrape time goes (mean seconds per URL)")
+        breakdown = (timing[PHASES].reset_index()
+                     .assign(Group=lambda df: df['country'] + ' ' + df['brand'])
+                     .melt(id_vars='Group', value_vars=PHASES, var_name='Phase', value_name='Seconds'))
+        st.plotly_chart(
+            px.bar(breakdown, x='Seconds', y='Group', color='Phase', orientation='h',
+                   category_orders={'Phase': PHASES}),
+            use_container_width=True
+        )
+        st.dataframe(timing.round(3), use_container_width=True)
+
+    st.subheader("Requests per host")
+    per_host = requests_df.pivot_table(index='host', columns=['outcome', 'status'], values='value',
+                                       aggfunc='sum', fill_value=0)
+    st.dataframe(per_host.astype(int), use_container_width=True)
+
+    slow_df = samples[samples['metric'] == 'scrape_slow_requests_total']
+    if not slow_df.empty:
+        st.subheader("Slow requests per host")
+        st.dataframe(slow_df.pivot_table(index='host', columns='outcome', values='value', aggfunc='sum',
+                                         fill_value=0).astype(int), use_container_width=True)
+
+    with open(METRICS_FILE) as f:
+        st.download_button("Download Prometheus file", f.read(), file_name="scrape_metrics.prom", mime="text/plain")
+
+
+if __name__ == "__main__":
+    main()
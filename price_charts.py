@@ -0,0 +1,66 @@
+"""Chart data for price history plots.
+
+Series are loaded for many SKUs and countries in one query and downsampled
+on the server to a fixed point budget before they reach plotly, so the chart
+payload stays bounded however long the history gets.
+"""
+import pandas as pd
+
+MAX_CHART_POINTS = 2000
+
+
+def get_price_series(conn, skus=None, brand=None, countries=None):
+    query = '''
+        SELECT pr.SKU, c.CountryCode as country, p.EntryDate, p.Price
+        FROM Prices p
+        JOIN Products pr ON p.ProductID = pr.ProductID
+        JOIN Countries c ON p.CountryID = c.CountryID
+        WHERE 1 = 1
+    '''
+    params = []
+    if skus:
+        query += f" AND pr.SKU IN ({', '.join(['%s'] * len(skus))})"
+        params.extend(skus)
+    if brand:
+        # Products carry no brand; it is recorded with every scraped status
+        query += '''
+            AND p.ProductID IN (
+                SELECT ps.ProductID
+                FROM ProductStatus ps
+                JOIN Brands b ON ps.BrandID = b.BrandID
+                WHERE b.BrandName = %s
+            )
+        '''
+        params.append(brand)
+    if countries:
+        query += f" AND c.CountryCode IN ({', '.join(['%s'] * len(countries))})"
+        params.extend(countries)
+    df = pd.read_sql(query, conn, params=params)
+    df['EntryDate'] = pd.to_datetime(df['EntryDate'])
+    df['Price'] = df['Price'].astype(float)
+    return df
+
+
+def downsample(df, max_points=MAX_CHART_POINTS, series=('SKU', 'country'), x='EntryDate', y='Price'):
+    """Min/max per bucket downsampling of every series in df.
+
+    Each series gets an equal share of max_points. Its points are split into
+    buckets of consecutive entries and only the lowest and highest price of
+    each bucket are kept, plus the first and last point, so spikes and the
+    overall shape survive while the point count is bounded.
+    """
+    series = [column for column in series if column in df.columns]
+    if len(df) <= max_points:
+        return df.sort_values(series + [x])
+
+    df = df.sort_values(series + [x]).reset_index(drop=True)
+    groups = df.groupby(series, sort=False) if series else df.groupby(lambda _: 0)
+    buckets_per_series = max(max_points // groups.ngroups // 2, 1)
+
+    bucket = groups.cumcount() * buckets_per_series // groups[x].transform('size')
+    buckets = df[y].groupby([df[column] for column in series] + [bucket], sort=False)
+    keep = (pd.Index(buckets.idxmin())
+            .union(pd.Index(buckets.idxmax()))
+            .union(groups.head(1).index)
+            .union(groups.tail(1).index))
+    return df.loc[keep]
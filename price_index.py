@@ -0,0 +1,150 @@
+"""Rolling 30-day lowest price per SKU and country.
+
+PriceLowest30 keeps one row per (ProductID, CountryID) with the lowest Prices
+entry of the last WINDOW_DAYS days. Writers refresh the keys they touched and
+the keys whose lowest entry has slid out of the window. Reads never write:
+they recompute the keys expired since the last write from those keys' Prices
+entries alone, so reading the index never has to scan the Prices history.
+
+Writers also bump PriceWriteVersion in the same transaction, so caches of
+price reads can tell when Prices last changed.
+"""
+import pandas as pd
+
+WINDOW_DAYS = 30
+
+
+def ensure_lowest_price_index(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT OBJECT_ID('PriceLowest30', 'U')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute("""
+        CREATE TABLE PriceLowest30 (
+            ProductID INT NOT NULL,
+            CountryID INT NOT NULL,
+            LowestPrice DECIMAL(10, 2) NOT NULL,
+            LowestPriceDate DATETIME NOT NULL,
+            PRIMARY KEY (ProductID, CountryID),
+            FOREIGN KEY (ProductID) REFERENCES Products(ProductID),
+            FOREIGN KEY (CountryID) REFERENCES Countries(CountryID)
+        )
+        """)
+        # Backfill from the existing history once
+        _stage_keys(cursor)
+        cursor.execute("INSERT INTO #LowestPriceKeys SELECT DISTINCT ProductID, CountryID FROM Prices")
+        _refresh_staged_keys(cursor)
+        conn.commit()
+    cursor.execute("SELECT OBJECT_ID('PriceWriteVersion', 'U')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute("""
+        CREATE TABLE PriceWriteVersion (
+            Id INT PRIMARY KEY CHECK (Id = 1),
+            Version BIGINT NOT NULL
+        )
+        """)
+        cursor.execute("INSERT INTO PriceWriteVersion (Id, Version) VALUES (1, 0)")
+        conn.commit()
+    cursor.close()
+
+
+def _stage_keys(cursor):
+    cursor.execute("IF OBJECT_ID('tempdb..#LowestPriceKeys') IS NOT NULL DROP TABLE #LowestPriceKeys")
+    cursor.execute("""
+    CREATE TABLE #LowestPriceKeys (
+        ProductID INT,
+        CountryID INT,
+        PRIMARY KEY (ProductID, CountryID)
+    )
+    """)
+
+
+def _lowest_in_window(keys):
+    """SELECT of the lowest entry of the window per key of the keys table expression."""
+    # LowestPriceDate is the latest entry at the lowest price, so the row stays
+    # valid until that entry leaves the window
+    return f"""
+    SELECT ProductID, CountryID, LowestPrice, MAX(EntryDate) AS LowestPriceDate
+    FROM (
+        SELECT
+            p.ProductID,
+            p.CountryID,
+            p.Price,
+            p.EntryDate,
+            MIN(p.Price) OVER (PARTITION BY p.ProductID, p.CountryID) AS LowestPrice
+        FROM Prices p
+        JOIN {keys} k ON p.ProductID = k.ProductID AND p.CountryID = k.CountryID
+        WHERE p.EntryDate >= DATEADD(day, -{WINDOW_DAYS}, GETDATE())
+    ) windowed
+    WHERE Price = LowestPrice
+    GROUP BY ProductID, CountryID, LowestPrice
+    """
+
+
+def _refresh_staged_keys(cursor):
+    cursor.execute("""
+    DELETE l
+    FROM PriceLowest30 l
+    JOIN #LowestPriceKeys k ON l.ProductID = k.ProductID AND l.CountryID = k.CountryID
+    """)
+    cursor.execute(f"""
+    INSERT INTO PriceLowest30 (ProductID, CountryID, LowestPrice, LowestPriceDate)
+    {_lowest_in_window('#LowestPriceKeys')}
+    """)
+
+
+def refresh_lowest_prices(cursor, keys):
+    """Recomputes the index for the given (SKU, CountryCode) pairs and for expired rows.
+
+    Runs on the caller's cursor so it commits or rolls back with the write
+    that touched the prices.
+    """
+    keys = list(set(keys))
+    if not keys:
+        return
+    _stage_keys(cursor)
+    cursor.executemany("""
+    INSERT INTO #LowestPriceKeys (ProductID, CountryID)
+    SELECT pr.ProductID, c.CountryID
+    FROM Products pr, Countries c
+    WHERE pr.SKU = %s AND c.CountryCode = %s
+    """, keys)
+    cursor.execute(f"""
+    INSERT INTO #LowestPriceKeys (ProductID, CountryID)
+    SELECT ProductID, CountryID
+    FROM PriceLowest30 l
+    WHERE LowestPriceDate < DATEADD(day, -{WINDOW_DAYS}, GETDATE())
+        AND NOT EXISTS (SELECT * FROM #LowestPriceKeys k WHERE k.ProductID = l.ProductID AND k.CountryID = l.CountryID)
+    """)
+    _refresh_staged_keys(cursor)
+    cursor.execute("UPDATE PriceWriteVersion SET Version = Version + 1")
+
+
+def get_lowest_prices(conn, country=None, skus=None):
+    """Reads the index without writing; rows expired since the last write are recomputed in the query."""
+    query = f"""
+        WITH expired AS (
+            SELECT ProductID, CountryID
+            FROM PriceLowest30
+            WHERE LowestPriceDate < DATEADD(day, -{WINDOW_DAYS}, GETDATE())
+        ), lowest AS (
+            SELECT ProductID, CountryID, LowestPrice, LowestPriceDate
+            FROM PriceLowest30
+            WHERE LowestPriceDate >= DATEADD(day, -{WINDOW_DAYS}, GETDATE())
+            UNION ALL
+            {_lowest_in_window('expired')}
+        )
+        SELECT pr.SKU, c.CountryCode as country, l.LowestPrice, l.LowestPriceDate
+        FROM lowest l
+        JOIN Products pr ON l.ProductID = pr.ProductID
+        JOIN Countries c ON l.CountryID = c.CountryID
+        WHERE 1 = 1
+    """
+    params = []
+    if country:
+        query += " AND c.CountryCode = %s"
+        params.append(country)
+    if skus:
+        query += f" AND pr.SKU IN ({', '.join(['%s'] * len(skus))})"
+        params.extend(skus)
+    query += " ORDER BY pr.SKU, c.CountryCode"
+    return pd.read_sql(query, conn, params=params)
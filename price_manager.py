@@ -0,0 +1,264 @@
+"""Price history of SKUs per country, shared by the Price Tracking page and scripts."""
+import io
+
+import pandas as pd
+
+from db import get_db_connection, run_once
+from frame_types import typed_frame
+from price_charts import get_price_series
+from price_index import ensure_lowest_price_index, get_lowest_prices, refresh_lowest_prices
+from price_parser import normalize_prices
+
+IMPORT_KEY = ['SKU', 'Country', 'EntryDate']
+
+
+class PriceManager:
+    def __init__(self):
+        self.conn = get_db_connection()
+        self.cursor = self.conn.cursor()
+        run_once(ensure_lowest_price_index, self.conn)
+
+    def upsert_price(self, sku, price, entry_date, reason, country):
+        # Get ProductID and CountryID
+        self.cursor.execute("SELECT ProductID FROM Products WHERE SKU = %s", (sku,))
+        product_id = self.cursor.fetchone()
+        if not product_id:
+            self.cursor.execute("INSERT INTO Products (SKU, ProductName) VALUES (%s, %s)", (sku, f"Product {sku}"))
+            product_id = self.cursor.lastrowid
+        else:
+            product_id = product_id[0]
+
+        self.cursor.execute("SELECT CountryID FROM Countries WHERE CountryCode = %s", (country,))
+        country_id = self.cursor.fetchone()
+        if not country_id:
+            self.cursor.execute("INSERT INTO Countries (CountryCode) VALUES (%s)", (country,))
+            country_id = self.cursor.lastrowid
+        else:
+            country_id = country_id[0]
+
+        # Insert or update price
+        self.cursor.execute('''
+            MERGE INTO Prices AS target
+            USING (VALUES (%s, %s, %s, %s, %s)) AS source (ProductID, CountryID, Price, EntryDate, Reason)
+            ON target.ProductID = source.ProductID AND target.CountryID = source.CountryID AND target.EntryDate = source.EntryDate
+            WHEN MATCHED THEN
+                UPDATE SET Price = source.Price, Reason = source.Reason
+            WHEN NOT MATCHED THEN
+                INSERT (ProductID, CountryID, Price, EntryDate, Reason)
+                VALUES (source.ProductID, source.CountryID, source.Price, source.EntryDate, source.Reason)
+        ''', (product_id, country_id, price, entry_date, reason))
+        refresh_lowest_prices(self.cursor, [(sku, country)])
+        self.conn.commit()
+
+    def get_price_history(self, sku, country=None, days=None):
+        query = '''
+            SELECT p.EntryDate, p.Price, p.Reason, c.CountryCode as country 
+            FROM Prices p
+            JOIN Products pr ON p.ProductID = pr.ProductID
+            JOIN Countries c ON p.CountryID = c.CountryID
+            WHERE pr.SKU = %s
+        '''
+        params = [sku]
+        if country:
+            query += " AND c.CountryCode = %s"
+            params.append(country)
+        if days:
+            query += f" AND p.EntryDate >= DATEADD(day, -{days}, GETDATE())"
+        query += " ORDER BY p.EntryDate DESC"
+        df = pd.read_sql(query, self.conn, params=params)
+        return typed_frame(df, categories=('Reason', 'country'), prices=('Price',), dates=('EntryDate',))
+
+    def delete_entry(self, sku, entry_date, country):
+        self.cursor.execute('''
+            DELETE FROM Prices 
+            WHERE ProductID = (SELECT ProductID FROM Products WHERE SKU = %s)
+            AND CountryID = (SELECT CountryID FROM Countries WHERE CountryCode = %s)
+            AND EntryDate = %s
+        ''', (sku, country, entry_date))
+        deleted = self.cursor.rowcount
+        refresh_lowest_prices(self.cursor, [(sku, country)])
+        self.conn.commit()
+        return deleted
+
+    def apply_price_edits(self, deletes=(), updates=None):
+        """Applies deletes and updates of Prices entries in one transaction.
+
+        deletes is an iterable of (SKU, Country, EntryDate) keys, updates a
+        DataFrame with SKU, Country, EntryDate, Price and Reason columns.
+        Returns the outcome per key: DELETED, UPDATED or NOT FOUND.
+        """
+        edits = [('DELETE', sku, country, entry_date, None, None) for sku, country, entry_date in deletes]
+        if updates is not None:
+            edits += [('UPDATE',) + tuple(row) for row in
+                      updates[['SKU', 'Country', 'EntryDate', 'Price', 'Reason']].astype(object).values.tolist()]
+        edits = pd.DataFrame(edits, columns=['Action', 'SKU', 'Country', 'EntryDate', 'Price', 'Reason'])
+        edits.insert(0, 'RowNo', range(len(edits)))
+        if edits.empty:
+            return edits.assign(Outcome=pd.Series(dtype=object))
+
+        try:
+            self.cursor.execute("IF OBJECT_ID('tempdb..#PriceEdits') IS NOT NULL DROP TABLE #PriceEdits")
+            self.cursor.execute('''
+                CREATE TABLE #PriceEdits (
+                    RowNo INT PRIMARY KEY,
+                    Action NVARCHAR(10),
+                    SKU NVARCHAR(50),
+                    CountryCode NVARCHAR(2),
+                    EntryDate DATETIME,
+                    Price DECIMAL(10, 2),
+                    Reason NVARCHAR(255)
+                )
+            ''')
+            self.cursor.executemany("INSERT INTO #PriceEdits VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                                    edits.astype(object).where(edits.notna(), None).values.tolist())
+            self.cursor.execute('''
+                MERGE INTO Prices AS target
+                USING (
+                    SELECT e.RowNo, e.Action, pr.ProductID, c.CountryID, e.EntryDate, e.Price, e.Reason
+                    FROM #PriceEdits e
+                    JOIN Products pr ON pr.SKU = e.SKU
+                    JOIN Countries c ON c.CountryCode = e.CountryCode
+                ) AS source
+                ON target.ProductID = source.ProductID AND target.CountryID = source.CountryID AND target.EntryDate = source.EntryDate
+                WHEN MATCHED AND source.Action = 'DELETE' THEN
+                    DELETE
+                WHEN MATCHED AND source.Action = 'UPDATE' THEN
+                    UPDATE SET Price = source.Price, Reason = source.Reason
+                OUTPUT source.RowNo, $action;
+            ''')
+            applied = pd.DataFrame(self.cursor.fetchall(), columns=['RowNo', 'Outcome'])
+            refresh_lowest_prices(self.cursor, edits[['SKU', 'Country']].itertuples(index=False, name=None))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        outcomes = edits.merge(applied, on='RowNo', how='left').drop(columns='RowNo')
+        outcomes['Outcome'] = outcomes['Outcome'].map({'DELETE': 'DELETED', 'UPDATE': 'UPDATED'}).fillna('NOT FOUND')
+        return outcomes
+
+    def get_lowest_prices(self, country=None, skus=None):
+        return get_lowest_prices(self.conn, country, skus)
+
+    def get_price_series(self, skus=None, brand=None, countries=None):
+        return get_price_series(self.conn, skus, brand, countries)
+
+    def get_brands(self):
+        return pd.read_sql("SELECT BrandName FROM Brands ORDER BY BrandName", self.conn)['BrandName'].tolist()
+
+    def validate_price_import(self, df, default_country, default_reason):
+        missing = {'SKU', 'EntryDate', 'Price'} - set(df.columns)
+        if missing:
+            raise ValueError(f"Missing column(s) in price sheet: {', '.join(sorted(missing))}")
+
+        def column(name):
+            if name in df.columns:
+                return df[name].astype('string').str.strip().replace('', pd.NA)
+            return pd.Series(pd.NA, index=df.index, dtype='string')
+
+        # Row numbers as shown in the spreadsheet (header is row 1)
+        checked = pd.DataFrame({'Row': df.index + 2})
+        checked['SKU'] = column('SKU')
+        checked['Country'] = column('Country').str.upper().fillna(default_country)
+        # ISO dates first, then the day-first formats the sheets are usually typed in
+        entry_date = pd.to_datetime(df['EntryDate'], errors='coerce', format='ISO8601')
+        entry_date = entry_date.fillna(pd.to_datetime(df['EntryDate'], errors='coerce', dayfirst=True, format='mixed'))
+        checked['EntryDate'] = entry_date.dt.date
+        checked['Price'] = normalize_prices(df['Price'])[0]
+        checked['Reason'] = column('Reason').fillna(default_reason)
+
+        known_skus = pd.read_sql("SELECT SKU FROM Products", self.conn)['SKU']
+        known_countries = pd.read_sql("SELECT CountryCode FROM Countries", self.conn)['CountryCode']
+
+        checks = [
+            (checked['SKU'].isna(), 'missing SKU'),
+            (checked['SKU'].notna() & ~checked['SKU'].isin(known_skus), 'unknown SKU'),
+            (~checked['Country'].isin(known_countries), 'unknown country'),
+            (checked['EntryDate'].isna(), 'invalid date'),
+            (checked['Price'].isna(), 'invalid price'),
+            (checked['Price'] <= 0, 'price must be positive'),
+            (checked['EntryDate'].notna() & checked.duplicated(subset=IMPORT_KEY, keep=False),
+             'duplicate SKU/country/date'),
+        ]
+        errors = pd.Series('', index=checked.index)
+        for mask, message in checks:
+            errors = errors.where(~mask.fillna(False).astype(bool), errors + message + '; ')
+        checked['Error'] = errors.str.rstrip('; ')
+        return checked
+
+    def bulk_upsert_prices(self, df, dry_run=False):
+        # Stage the whole sheet and apply it with a single MERGE. A dry run executes
+        # the same statements and rolls back, so the preview matches the real import.
+        rows = df[['Row', 'SKU', 'Country', 'Price', 'EntryDate', 'Reason']].astype(object).values.tolist()
+        try:
+            self.cursor.execute("IF OBJECT_ID('tempdb..#PriceImport') IS NOT NULL DROP TABLE #PriceImport")
+            self.cursor.execute('''
+                CREATE TABLE #PriceImport (
+                    RowNo INT PRIMARY KEY,
+                    SKU NVARCHAR(50),
+                    CountryCode NVARCHAR(2),
+                    Price DECIMAL(10, 2),
+                    EntryDate DATE,
+                    Reason NVARCHAR(255)
+                )
+            ''')
+            self.cursor.executemany("INSERT INTO #PriceImport VALUES (%s, %s, %s, %s, %s, %s)", rows)
+            self.cursor.execute('''
+                MERGE INTO Prices AS target
+                USING (
+                    SELECT s.RowNo, pr.ProductID, c.CountryID, s.Price, s.EntryDate, s.Reason
+                    FROM #PriceImport s
+                    JOIN Products pr ON pr.SKU = s.SKU
+                    JOIN Countries c ON c.CountryCode = s.CountryCode
+                ) AS source
+                ON target.ProductID = source.ProductID AND target.CountryID = source.CountryID AND target.EntryDate = source.EntryDate
+                WHEN MATCHED AND (target.Price <> source.Price OR ISNULL(target.Reason, '') <> ISNULL(source.Reason, '')) THEN
+                    UPDATE SET Price = source.Price, Reason = source.Reason
+                WHEN NOT MATCHED THEN
+                    INSERT (ProductID, CountryID, Price, EntryDate, Reason)
+                    VALUES (source.ProductID, source.CountryID, source.Price, source.EntryDate, source.Reason)
+                OUTPUT source.RowNo, $action, deleted.Price;
+            ''')
+            applied = pd.DataFrame(self.cursor.fetchall(), columns=['Row', 'Action', 'PreviousPrice'])
+            if dry_run:
+                self.conn.rollback()
+            else:
+                refresh_lowest_prices(self.cursor, df[['SKU', 'Country']].itertuples(index=False, name=None))
+                self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        results = df.merge(applied, on='Row', how='left')
+        results['Action'] = results['Action'].fillna('UNCHANGED')
+        return results
+
+    def search_skus(self, term):
+        return pd.read_sql("SELECT DISTINCT SKU FROM Products WHERE SKU LIKE %s",
+                           self.conn, params=(f'%{term}%',))['SKU'].tolist()
+
+    def export_data(self):
+        query = '''
+            SELECT pr.SKU, p.Price, p.EntryDate, p.Reason, c.CountryCode as Country
+            FROM Prices p
+            JOIN Products pr ON p.ProductID = pr.ProductID
+            JOIN Countries c ON p.CountryID = c.CountryID
+        '''
+        df = pd.read_sql(query, self.conn)
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='Prices')
+        return output.getvalue()
+
+    def get_price_changes_by_date(self, search_date, country):
+        query = '''
+            SELECT pr.SKU, p.Price, p.Reason
+            FROM Prices p
+            JOIN Products pr ON p.ProductID = pr.ProductID
+            JOIN Countries c ON p.CountryID = c.CountryID
+            WHERE p.EntryDate = %s AND c.CountryCode = %s
+        '''
+        return pd.read_sql(query, self.conn, params=(search_date, country))
+
+    def __del__(self):
+        self.conn.close()
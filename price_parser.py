@@ -0,0 +1,48 @@
+"""Vectorized normalization of scraped price strings.
+
+The NL, BE and FR sites format prices as "199,99 €", "€ 1.299,00",
+"1 299,00 €" or "199,-", and a missing price tag is scraped as "N/A".
+normalize_prices turns a whole column of such strings into numbers in one
+pass and reports which inputs could not be parsed.
+"""
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MISSING_VALUES = ['', 'N/A', 'NA', 'NAN', 'NONE', '-']
+
+# Optional thousands groups, then an optional 1-2 digit decimal part. The
+# separators are told apart by position: a separator followed by exactly
+# three digits groups thousands, one followed by the last 1-2 digits is the
+# decimal mark ("1.299" is 1299, "1.29" is 1.29).
+PRICE_PATTERN = (
+    r'^(?P<whole>\d{1,3}(?:(?P<thousands>[.,])\d{3})(?:(?P=thousands)\d{3})*|\d+)'
+    r'(?:(?P<decimal>[.,])(?P<cents>\d{1,2}))?$'
+)
+
+
+def normalize_prices(values):
+    """Returns the prices as a float Series (NaN where missing or unparseable)
+    and the raw inputs that were present but could not be parsed."""
+    raw = pd.Series(values)
+    text = raw.astype('string')
+    # FR pages put (narrow) no-break spaces between thousands; the characters are listed
+    # explicitly as \s only matches ASCII whitespace with pyarrow string storage
+    text = text.str.replace('[\\s\u00a0\u202f]+', '', regex=True)
+    text = text.str.replace(r'(?i)€|eur(o|os)?', '', regex=True)
+    # "199,-" is a whole amount
+    text = text.str.replace(r'[.,]-+$', '', regex=True)
+
+    missing = text.isna() | text.str.upper().isin(MISSING_VALUES)
+
+    parts = text.str.extract(PRICE_PATTERN)
+    valid = parts['whole'].notna() & ~(parts['thousands'] == parts['decimal']).fillna(False)
+    digits = parts['whole'].str.replace(r'[.,]', '', regex=True) + '.' + parts['cents'].fillna('0')
+    prices = pd.to_numeric(digits.where(valid), errors='coerce').round(2).astype(float)
+
+    unparseable = raw[~missing & prices.isna()]
+    if not unparseable.empty:
+        logger.warning(f"{len(unparseable)} unparseable price(s), e.g. {unparseable.unique()[:5].tolist()}")
+    return prices, unparseable
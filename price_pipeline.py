@@ -0,0 +1,123 @@
+"""Turns scraped CurrentPrice values into Prices history.
+
+Each scrape batch is compared against the last known price per (SKU, country),
+held in memory for the lifetime of the process, and only real changes are
+written to Prices with Reason 'scraped'.
+"""
+import logging
+
+import pandas as pd
+
+from db import run_once
+from price_index import ensure_lowest_price_index, refresh_lowest_prices
+from price_parser import normalize_prices
+
+SCRAPED_REASON = 'scraped'
+
+logger = logging.getLogger(__name__)
+
+# Last known price per (SKU, Country), loaded from Prices on first use
+_last_prices = None
+
+
+def load_last_prices(conn):
+    query = """
+    SELECT SKU, CountryCode AS Country, Price
+    FROM (
+        SELECT
+            pr.SKU,
+            c.CountryCode,
+            p.Price,
+            ROW_NUMBER() OVER (PARTITION BY p.ProductID, p.CountryID ORDER BY p.EntryDate DESC) AS rn
+        FROM Prices p
+        JOIN Products pr ON p.ProductID = pr.ProductID
+        JOIN Countries c ON p.CountryID = c.CountryID
+    ) latest
+    WHERE rn = 1
+    """
+    df = pd.read_sql(query, conn)
+    df['Price'] = df['Price'].astype(float)
+    return df
+
+
+def reset_last_prices():
+    global _last_prices
+    _last_prices = None
+
+
+def find_price_changes(conn, df):
+    """Returns the rows of a scrape batch whose price differs from the last known one."""
+    global _last_prices
+    if _last_prices is None:
+        _last_prices = load_last_prices(conn)
+
+    batch = pd.DataFrame({
+        'SKU': df['SKU'],
+        'Country': df['Country'],
+        'Price': normalize_prices(df['Current Price'])[0],
+        'EntryDate': pd.to_datetime(df['Date']).dt.date,
+    }).dropna(subset=['SKU', 'Price'])
+    batch = batch[batch['Price'] > 0].drop_duplicates(subset=['SKU', 'Country'], keep='last')
+
+    batch = batch.merge(_last_prices, on=['SKU', 'Country'], how='left', suffixes=('', 'Previous'))
+    changed = batch[batch['PricePrevious'].isna() | (batch['Price'] != batch['PricePrevious'])]
+    return changed.drop(columns='PricePrevious')
+
+
+def _remember_prices(changed):
+    global _last_prices
+    keys = pd.MultiIndex.from_frame(changed[['SKU', 'Country']])
+    unchanged = ~pd.MultiIndex.from_frame(_last_prices[['SKU', 'Country']]).isin(keys)
+    _last_prices = pd.concat([_last_prices[unchanged], changed[['SKU', 'Country', 'Price']]], ignore_index=True)
+
+
+def record_scraped_prices(conn, df):
+    changed = find_price_changes(conn, df)
+    if changed.empty:
+        return 0
+
+    run_once(ensure_lowest_price_index, conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#ScrapedPrices') IS NOT NULL DROP TABLE #ScrapedPrices")
+        cursor.execute("""
+        CREATE TABLE #ScrapedPrices (
+            SKU NVARCHAR(50),
+            CountryCode NVARCHAR(2),
+            Price DECIMAL(10, 2),
+            EntryDate DATE
+        )
+        """)
+        cursor.executemany("INSERT INTO #ScrapedPrices VALUES (%s, %s, %s, %s)",
+                           changed[['SKU', 'Country', 'Price', 'EntryDate']].astype(object).values.tolist())
+        # Same-day entries entered by hand are left alone
+        cursor.execute("""
+        MERGE INTO Prices AS target
+        USING (
+            SELECT pr.ProductID, c.CountryID, s.SKU, s.CountryCode, s.Price, s.EntryDate
+            FROM #ScrapedPrices s
+            JOIN Products pr ON pr.SKU = s.SKU
+            JOIN Countries c ON c.CountryCode = s.CountryCode
+        ) AS source
+        ON target.ProductID = source.ProductID AND target.CountryID = source.CountryID AND target.EntryDate = source.EntryDate
+        WHEN MATCHED AND target.Reason = %s AND target.Price <> source.Price THEN
+            UPDATE SET Price = source.Price
+        WHEN NOT MATCHED THEN
+            INSERT (ProductID, CountryID, Price, EntryDate, Reason)
+            VALUES (source.ProductID, source.CountryID, source.Price, source.EntryDate, %s)
+        OUTPUT source.SKU, source.CountryCode;
+        """, (SCRAPED_REASON, SCRAPED_REASON))
+        written_keys = cursor.fetchall()
+        refresh_lowest_prices(cursor, written_keys)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    # Prices skipped for a manual entry are not remembered, so the next batch compares against the last written one
+    written = changed.merge(pd.DataFrame(written_keys, columns=['SKU', 'Country']), on=['SKU', 'Country'])
+    _remember_prices(written)
+    logger.info(f"Recorded {len(written)} scraped price changes")
+    return len(written)
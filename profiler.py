@@ -0,0 +1,163 @@
+"""Per-session rerun profiler.
+
+When profiling is switched on in the sidebar, a page calls start_profile()
+at the top and render_profile() at the bottom, and wraps its sections in
+span(). Database statements (through db) are recorded as spans automatically,
+and so are the dataframe, data_editor and plotly_chart calls a page makes
+through the wrappers of this module instead of st. The finished
+profile is drawn as a flame-style chart and appended to PROFILE_FILE tagged
+with the deployed version, so the Admin page can compare deploys.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+import db
+
+PROFILE_FILE = os.path.join('LOGS', 'rerun_profiles.jsonl')
+# Written by the deploy workflow
+VERSION_FILE = 'DEPLOY_VERSION'
+
+SPAN_COLORS = {'page': '#9aa5b1', 'section': '#2D12CC', 'query': '#e4572e', 'render': '#29a19c'}
+
+# Streamlit runs every session's script on its own thread
+_local = threading.local()
+_file_lock = threading.Lock()
+
+
+def deploy_version():
+    if os.path.exists(VERSION_FILE):
+        with open(VERSION_FILE) as f:
+            return f.read().strip()[:12]
+    return os.environ.get('DEPLOY_VERSION', 'local')
+
+
+class Profile:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.spans = []
+        self.depth = 0
+
+    def add(self, name, kind, start, seconds, depth=None):
+        self.spans.append({
+            'name': name,
+            'kind': kind,
+            'depth': self.depth if depth is None else depth,
+            'start': start - self.started,
+            'seconds': seconds,
+        })
+
+
+def active_profile():
+    return getattr(_local, 'profile', None)
+
+
+def start_profile(page):
+    # The sidebar toggle is drawn after this, so its new value is only in its widget key yet
+    profiling = st.session_state.get('profiling_toggle', st.session_state.get('profiling', False))
+    _local.profile = Profile(page) if profiling else None
+
+
+@contextmanager
+def span(name, kind='section'):
+    profile = active_profile()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    depth = profile.depth
+    profile.depth += 1
+    try:
+        yield
+    finally:
+        profile.depth = depth
+        profile.add(name, kind, start, time.perf_counter() - start, depth)
+
+
+def _record_statement(record):
+    profile = active_profile()
+    if profile is not None:
+        profile.add(record['caller'], 'query', record['started'], record['seconds'])
+
+
+def _timed_element(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if active_profile() is None:
+            return fn(*args, **kwargs)
+        caller = sys._getframe(1)
+        with span(f"st.{fn.__name__} ({os.path.basename(caller.f_code.co_filename)}:{caller.f_lineno})", 'render'):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+db.statement_listeners.append(_record_statement)
+dataframe = _timed_element(st.dataframe)
+data_editor = _timed_element(st.data_editor)
+plotly_chart = _timed_element(st.plotly_chart)
+
+
+def save_profile(profile, total):
+    os.makedirs(os.path.dirname(PROFILE_FILE), exist_ok=True)
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'version': deploy_version(),
+        'page': profile.page,
+        'seconds': total,
+        'spans': profile.spans,
+    }
+    with _file_lock, open(PROFILE_FILE, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def render_profile():
+    profile = active_profile()
+    if profile is None:
+        return
+    _local.profile = None
+    total = time.perf_counter() - profile.started
+    save_profile(profile, total)
+
+    import plotly.graph_objects as go
+
+    spans = pd.DataFrame(profile.spans)
+    with st.expander(f"Rerun profile: {total:.2f}s", expanded=True):
+        if spans.empty:
+            st.info("No spans recorded.")
+            return
+        fig = go.Figure()
+        for kind, group in spans.groupby('kind'):
+            fig.add_trace(go.Bar(
+                x=group['seconds'], base=group['start'], y=group['depth'], orientation='h',
+                name=kind, marker_color=SPAN_COLORS.get(kind), text=group['name'], textposition='inside',
+                insidetextanchor='start', hovertemplate='%{text}<br>%{x:.3f}s<extra></extra>',
+            ))
+        fig.update_layout(barmode='overlay', height=120 + 40 * (spans['depth'].max() + 1),
+                          xaxis_title='Seconds since rerun start', yaxis_title='Depth',
+                          yaxis=dict(autorange='reversed', dtick=1))
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(
+            spans.sort_values('seconds', ascending=False).round(4), hide_index=True, use_container_width=True)
+
+
+def load_profiles():
+    """One row per recorded span of every persisted rerun."""
+    if not os.path.exists(PROFILE_FILE):
+        return pd.DataFrame(columns=['time', 'version', 'page', 'name', 'kind', 'seconds'])
+    with open(PROFILE_FILE) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    reruns = pd.DataFrame([{'time': e['time'], 'version': e['version'], 'page': e['page'],
+                            'name': 'rerun', 'kind': 'page', 'seconds': e['seconds']} for e in entries])
+    spans = pd.DataFrame([{'time': e['time'], 'version': e['version'], 'page': e['page'],
+                           'name': s['name'], 'kind': s['kind'], 'seconds': s['seconds']}
+                          for e in entries for s in e['spans']])
+    return pd.concat([reruns, spans], ignore_index=True)
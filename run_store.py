@@ -0,0 +1,178 @@
+"""Columnar store of scrape runs.
+
+Every run is written as zstd-compressed Parquet under RUN_STORE_DIR, hive
+partitioned so readers open only the days and markets they ask for:
+
+    products/RunDate=2026-10-19/Country=NL/Brand=Ninja/<run_id>-<writer>-<part>-0.parquet
+    skipped/RunDate=2026-10-19/Country=NL/Brand=Ninja/<run_id>-<writer>-<part>-0.parquet
+    runs/RunDate=2026-10-19/<run_id>-<writer>-0.parquet
+
+products holds every scraped product of the run with its raw and parsed
+price, skipped every URL that was not reported IN or OUT with the reason, and
+runs one row of timing metadata per writer (a queue run can be written by
+several `write` invocations). load() reads only the requested
+columns and partitions, memory-mapped, so cross-run diffs and exports run
+locally without querying SQL Server. Point RUN_STORE_DIR at a share to read
+the scrapers' runs from the dashboard.
+"""
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from urllib.parse import urlparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow.dataset import partitioning
+
+from price_parser import normalize_prices
+
+RUN_STORE_DIR = os.environ.get('RUN_STORE_DIR', 'RUNS')
+COMPRESSION = 'zstd'
+
+MARKET_PARTITIONS = ['RunDate', 'Country', 'Brand']
+PARTITIONS = {
+    'products': MARKET_PARTITIONS,
+    'skipped': MARKET_PARTITIONS,
+    'runs': ['RunDate'],
+}
+SKIPPED_COLUMNS = ['URL', 'Reason', 'HTTPStatus', 'Seconds']
+
+logger = logging.getLogger(__name__)
+
+
+def new_run_id():
+    # Sorts by start time
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def _write(kind, df, basename, directory):
+    df.to_parquet(os.path.join(directory, kind), engine='pyarrow', compression=COMPRESSION, index=False,
+                  partition_cols=PARTITIONS[kind], basename_template=basename + '-{i}.parquet')
+
+
+class RunWriter:
+    """Writes the batches of one run as they are scraped, then the run's metadata."""
+
+    def __init__(self, run_id=None, source='spool', directory=RUN_STORE_DIR):
+        self.run_id = run_id or new_run_id()
+        self.writer_id = uuid.uuid4().hex[:6]
+        self.source = source
+        self.directory = directory
+        self.started = datetime.now()
+        self.run_date = self.started.strftime('%Y-%m-%d')
+        self.parts = 0
+        self.products = 0
+        self.skipped = 0
+        self.scrape_seconds = 0.0
+
+    def add(self, country, brand, products, skip_log=(), seconds=None):
+        """Writes a batch: products as save_to_db takes them, skip_log as check_availability fills it."""
+        self.parts += 1
+        basename = f"{self.run_id}-{self.writer_id}-{self.parts:04d}"
+        if seconds is not None:
+            self.scrape_seconds += seconds
+        try:
+            if not products.empty:
+                prices, _ = normalize_prices(products['Current Price'])
+                df = products.assign(
+                    run_id=self.run_id, RunDate=self.run_date, Country=country, Brand=brand,
+                    Date=pd.to_datetime(products['Date']), Price=prices.values)
+                _write('products', df, basename, self.directory)
+                self.products += len(df)
+            if skip_log:
+                df = pd.DataFrame(list(skip_log), columns=SKIPPED_COLUMNS).assign(
+                    run_id=self.run_id, RunDate=self.run_date, Country=country, Brand=brand)
+                df['Host'] = df['URL'].map(lambda url: urlparse(url).hostname)
+                df['HTTPStatus'] = df['HTTPStatus'].astype('Int16')
+                df['Seconds'] = df['Seconds'].astype(float)
+                _write('skipped', df, basename, self.directory)
+                self.skipped += len(df)
+        except (OSError, pa.ArrowException) as e:
+            logger.error(f"Error writing run {self.run_id} to {self.directory}: {e}")
+
+    def finish(self, urls=None):
+        finished = datetime.now()
+        df = pd.DataFrame([{
+            'run_id': self.run_id,
+            'Writer': self.writer_id,
+            'RunDate': self.run_date,
+            'Source': self.source,
+            'Host': socket.gethostname(),
+            'Started': self.started,
+            'Finished': finished,
+            'Seconds': (finished - self.started).total_seconds(),
+            'ScrapeSeconds': self.scrape_seconds,
+            'URLs': urls,
+            'Products': self.products,
+            'Skipped': self.skipped,
+            'Parts': self.parts,
+        }]).astype({'URLs': 'Int64'})
+        try:
+            _write('runs', df, f"{self.run_id}-{self.writer_id}", self.directory)
+        except (OSError, pa.ArrowException) as e:
+            logger.error(f"Error writing run {self.run_id} to {self.directory}: {e}")
+
+
+def load(kind, columns=None, start=None, end=None, countries=None, brands=None, run_ids=None,
+         directory=RUN_STORE_DIR):
+    """Reads a part of the store; start and end are dates (inclusive), the partition filters lists."""
+    path = os.path.join(directory, kind)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns)
+    keys = PARTITIONS[kind]
+    filters = []
+    if start is not None:
+        filters.append(('RunDate', '>=', str(start)))
+    if end is not None:
+        filters.append(('RunDate', '<=', str(end)))
+    if countries and 'Country' in keys:
+        filters.append(('Country', 'in', list(countries)))
+    if brands and 'Brand' in keys:
+        filters.append(('Brand', 'in', list(brands)))
+    if run_ids:
+        filters.append(('run_id', 'in', list(run_ids)))
+    table = pq.read_table(
+        path, columns=columns, filters=filters or None, memory_map=True,
+        # Partition values stay strings; ISO dates compare correctly as text
+        partitioning=partitioning(pa.schema([(key, pa.string()) for key in keys]), flavor='hive'))
+    return table.to_pandas()
+
+
+def runs(start=None, end=None, directory=RUN_STORE_DIR):
+    df = load('runs', start=start, end=end, directory=directory)
+    return df.sort_values('run_id', ignore_index=True) if not df.empty else df
+
+
+def latest_run_id(country, brand, directory=RUN_STORE_DIR):
+    """Id of the last run that scraped products of the market, or None."""
+    df = load('products', columns=['run_id'], countries=[country], brands=[brand], directory=directory)
+    return df['run_id'].max() if not df.empty else None
+
+
+def price_changes(run_a, run_b, countries=None, brands=None, directory=RUN_STORE_DIR):
+    """SKUs whose price or status differs between two runs, including SKUs seen in only one of them."""
+    columns = ['run_id', 'SKU', 'Country', 'Brand', 'Price', 'Status']
+    df = load('products', columns=columns, countries=countries, brands=brands, run_ids=[run_a, run_b],
+              directory=directory)
+    key = ['SKU', 'Country', 'Brand']
+    # The same SKU can be listed under several URLs of a market
+    a = df[df['run_id'] == run_a].drop(columns='run_id').drop_duplicates(key)
+    b = df[df['run_id'] == run_b].drop(columns='run_id').drop_duplicates(key)
+    merged = a.merge(b, on=key, how='outer', suffixes=('Before', 'After'), indicator=True)
+    changed = ((merged['_merge'] != 'both')
+               | (merged['StatusBefore'].astype(object) != merged['StatusAfter'].astype(object))
+               | ~((merged['PriceBefore'] == merged['PriceAfter'])
+                   | (merged['PriceBefore'].isna() & merged['PriceAfter'].isna())))
+    merged = merged[changed].drop(columns='_merge')
+    return merged.assign(PriceChange=merged['PriceAfter'] - merged['PriceBefore']).reset_index(drop=True)
+
+
+def skipped_per_host(start=None, end=None, directory=RUN_STORE_DIR):
+    """Skipped URLs per day, host and reason."""
+    df = load('skipped', columns=['RunDate', 'Host', 'Reason'], start=start, end=end, directory=directory)
+    if df.empty:
+        return pd.DataFrame(columns=['RunDate', 'Host', 'Reason', 'Skipped'])
+    return df.groupby(['RunDate', 'Host', 'Reason'], observed=True).size().rename('Skipped').reset_index()
@@ -0,0 +1,152 @@
+"""Per-request scraper instrumentation.
+
+check_availability records one observation per fetched URL: DNS, connect,
+time to first byte and total latency, response size, parse time, HTTP status,
+outcome and host, and whether it took longer than the scraper's timeout.
+Observations are aggregated into histograms per (country, brand) group and
+exported in the Prometheus text format, which the Scrape Metrics page reads
+back. The connection timings come from scraper.http_timing, so the page does
+not import requests.
+"""
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+import pandas as pd
+
+METRICS_FILE = os.path.join('LOGS', 'scrape_metrics.prom')
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    'scrape_dns_seconds': ('DNS resolution time of new connections', LATENCY_BUCKETS),
+    'scrape_connect_seconds': ('TCP and TLS connect time of new connections', LATENCY_BUCKETS),
+    'scrape_ttfb_seconds': ('Time from sending the request to the response headers', LATENCY_BUCKETS),
+    'scrape_total_seconds': ('Time from sending the request to the last body byte', LATENCY_BUCKETS),
+    'scrape_parse_seconds': ('HTML parse and lookup time', LATENCY_BUCKETS),
+    'scrape_response_bytes': ('Response body size', BYTES_BUCKETS),
+}
+
+OUTCOMES = ('OUT', 'IN', 'skipped', 'error')
+
+class ScrapeMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # (name, labels) -> per-bucket counts with a final +Inf slot, and sums
+        self.bucket_counts = {}
+        self.sums = defaultdict(float)
+        self.requests = defaultdict(int)
+        self.slow_requests = defaultdict(int)
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        counts = self.bucket_counts.setdefault(key, [0] * (len(buckets) + 1))
+        counts[bisect_left(buckets, value)] += 1
+        self.sums[key] += value
+
+    def record(self, country, brand, host, outcome, status=None, dns=0.0, connect=0.0, ttfb=None, total=None,
+               response_bytes=None, parse=None, slow=False):
+        group = (('country', country or 'unknown'), ('brand', brand or 'unknown'))
+        with self.lock:
+            self.requests[group + (('host', host), ('outcome', outcome), ('status', str(status or '')))] += 1
+            if slow:
+                self.slow_requests[group + (('host', host), ('outcome', outcome))] += 1
+            if ttfb is None:
+                return
+            self.observe('scrape_dns_seconds', group, dns)
+            self.observe('scrape_connect_seconds', group, connect)
+            self.observe('scrape_ttfb_seconds', group, ttfb)
+            self.observe('scrape_total_seconds', group, total)
+            self.observe('scrape_response_bytes', group, response_bytes)
+            if parse is not None:
+                self.observe('scrape_parse_seconds', group, parse)
+
+    def to_prometheus(self):
+        lines = [
+            '# HELP scrape_requests_total Fetched URLs by outcome',
+            '# TYPE scrape_requests_total counter',
+        ]
+        with self.lock:
+            for labels, count in sorted(self.requests.items()):
+                lines.append(f'scrape_requests_total{_format_labels(labels)} {count}')
+            lines.append('# HELP scrape_slow_requests_total Fetched URLs that took longer than the timeout')
+            lines.append('# TYPE scrape_slow_requests_total counter')
+            for labels, count in sorted(self.slow_requests.items()):
+                lines.append(f'scrape_slow_requests_total{_format_labels(labels)} {count}')
+            for name, (help_text, buckets) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, labels), counts in sorted(self.bucket_counts.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {self.sums[(metric, labels)]:.6f}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path=METRICS_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a reader never sees a half-written file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+SAMPLE_PATTERN = re.compile(r'^(?P<metric>[a-z_]+)\{(?P<labels>[^}]*)\} (?P<value>\S+)$')
+LABEL_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+
+def read_prometheus(path=METRICS_FILE):
+    """Loads an exported metrics file as one row per sample."""
+    rows = []
+    with open(path) as f:
+        for line in f:
+            match = SAMPLE_PATTERN.match(line.strip())
+            if match:
+                row = dict(LABEL_PATTERN.findall(match['labels']))
+                row['metric'] = match['metric']
+                row['value'] = float(match['value'])
+                rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def histogram_quantile(buckets_df, quantile):
+    """Estimates a quantile per group from cumulative '_bucket' samples, like PromQL's histogram_quantile."""
+    df = buckets_df.assign(le=buckets_df['le'].astype(float)).sort_values(['country', 'brand', 'le'])
+
+    def estimate(group):
+        total = group['value'].iloc[-1]
+        if total == 0:
+            return float('nan')
+        rank = quantile * total
+        bounds = group['le'].tolist()
+        counts = group['value'].tolist()
+        for i, (bound, count) in enumerate(zip(bounds, counts)):
+            if count >= rank:
+                if bound == float('inf'):
+                    return bounds[i - 1] if i > 0 else float('nan')
+                lower = bounds[i - 1] if i > 0 else 0.0
+                below = counts[i - 1] if i > 0 else 0.0
+                return lower + (bound - lower) * (rank - below) / max(count - below, 1e-9)
+        return float('nan')
+
+    return df.groupby(['country', 'brand'])[['le', 'value']].apply(estimate)
+
+
+metrics = ScrapeMetrics()
@@ -0,0 +1,12 @@
+from scraper.core import (
+    PRODUCT_COLUMNS,
+    categorize_url,
+    check_availability,
+    create_tables,
+    extract_id_from_url,
+    group_urls_by_category,
+    headers,
+    process_urls,
+    save_to_db,
+    to_dataframe,
+)
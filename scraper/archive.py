@@ -0,0 +1,94 @@
+"""Append-only archive of fetched product pages.
+
+When SCRAPE_ARCHIVE_DIR is set, check_availability stores every page it
+fetched. Bodies are zlib-compressed and appended to segment files of at most
+SEGMENT_BYTES; each segment has an index file with one JSON line per page
+(URL, fetch time, status, headers, encoding, offset and length). Segment names
+carry the host and process id, so several workers can archive into one
+directory. scraper.replay feeds archived pages through the parser again.
+"""
+import glob
+import json
+import os
+import socket
+import threading
+import zlib
+from datetime import datetime
+
+import pandas as pd
+
+ARCHIVE_DIR = os.environ.get('SCRAPE_ARCHIVE_DIR')
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+INDEX_COLUMNS = ['url', 'fetched', 'status', 'headers', 'encoding', 'segment', 'offset', 'length', 'size']
+
+
+class HtmlArchive:
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._segment = None
+        self._sequence = 0
+        self._body_file = None
+        self._index_file = None
+
+    def _open_segment(self):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        self._segment = f"{datetime.now():%Y%m%d-%H%M%S}-{socket.gethostname()}-{os.getpid()}-{self._sequence:04d}"
+        self._body_file = open(os.path.join(self.directory, self._segment + '.seg'), 'ab')
+        self._index_file = open(os.path.join(self.directory, self._segment + '.idx'), 'a')
+
+    def record(self, url, status, headers, body, encoding=None, fetched=None):
+        data = zlib.compress(body)
+        with self._lock:
+            if self._body_file is None or self._body_file.tell() + len(data) > self.segment_bytes:
+                self._open_segment()
+            offset = self._body_file.tell()
+            self._body_file.write(data)
+            self._body_file.flush()
+            entry = {
+                'url': url,
+                'fetched': (fetched or datetime.now()).isoformat(timespec='seconds'),
+                'status': status,
+                'headers': dict(headers),
+                'encoding': encoding,
+                'segment': self._segment,
+                'offset': offset,
+                'length': len(data),
+                'size': len(body),
+            }
+            # Written after the body, so every indexed page is complete
+            self._index_file.write(json.dumps(entry) + '\n')
+            self._index_file.flush()
+
+    def entries(self):
+        """The index of all segments, in fetch order."""
+        rows = []
+        for path in glob.glob(os.path.join(self.directory, '*.idx')):
+            with open(path) as f:
+                rows.extend(json.loads(line) for line in f if line.strip())
+        df = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+        df['fetched'] = pd.to_datetime(df['fetched'])
+        df['encoding'] = df['encoding'].fillna('utf-8')
+        return df.sort_values(['fetched', 'segment', 'offset'], kind='stable', ignore_index=True)
+
+    def pages(self, entries):
+        """Yields (entry, html) for index entries, reading each segment front to back."""
+        for segment, group in entries.groupby('segment', sort=False):
+            with open(os.path.join(self.directory, segment + '.seg'), 'rb') as f:
+                for entry in group.sort_values('offset').itertuples(index=False):
+                    f.seek(entry.offset)
+                    body = zlib.decompress(f.read(entry.length))
+                    yield entry, body.decode(entry.encoding, errors='replace')
+
+    def close(self):
+        for f in (self._body_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._body_file = self._index_file = None
+
+
+archive = HtmlArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None
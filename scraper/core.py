@@ -0,0 +1,347 @@
+"""Stock scraper: fetches product pages, parses their status and saves it.
+
+Runs without Streamlit, so the dashboard, the work-queue workers and
+scheduled jobs share one code path. UI callers pass a progress callback.
+"""
+import logging
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+from requests.exceptions import Timeout
+
+from availability_rollup import refresh_daily_availability
+from db import get_db_connection, run_once
+from price_parser import normalize_prices
+from price_pipeline import record_scraped_prices
+from stock_events import ensure_stock_events, publish_events, record_stock_events
+from scrape_metrics import metrics
+from scraper.archive import archive
+from scraper.http_timing import connection_timings, mount_timed_adapter, reset_connection_timings
+from scraper.sites import default_selectors, find, site_for_url
+from scraper.url_index import record_scraped_urls
+
+logger = logging.getLogger("scraper")
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Column order of the product tuples returned by check_availability
+PRODUCT_COLUMNS = ['SKU', 'Product Name', 'Date', 'URL', 'Status', 'Type', 'Current Price']
+
+
+# Function to create tables (if they don't exist)
+def create_tables():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        # Create Countries table
+        cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Countries' and xtype='U')
+        CREATE TABLE Countries (
+            CountryID INT IDENTITY(1,1) PRIMARY KEY,
+            CountryCode NVARCHAR(2) UNIQUE
+        )
+        """)
+
+        # Create Brands table
+        cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Brands' and xtype='U')
+        CREATE TABLE Brands (
+            BrandID INT IDENTITY(1,1) PRIMARY KEY,
+            BrandName NVARCHAR(50) UNIQUE
+        )
+        """)
+
+        # Create Products table
+        cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Products' and xtype='U')
+        CREATE TABLE Products (
+            ProductID INT IDENTITY(1,1) PRIMARY KEY,
+            SKU NVARCHAR(50) UNIQUE,
+            ProductName NVARCHAR(255)
+        )
+        """)
+
+        # Create ProductStatus table
+        cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ProductStatus' and xtype='U')
+        CREATE TABLE ProductStatus (
+            StatusID INT IDENTITY(1,1) PRIMARY KEY,
+            ProductID INT,
+            CountryID INT,
+            BrandID INT,
+            Date DATETIME,
+            Status NVARCHAR(10),
+            Type NVARCHAR(50),
+            CurrentPrice DECIMAL(10, 2),
+            FOREIGN KEY (ProductID) REFERENCES Products(ProductID),
+            FOREIGN KEY (CountryID) REFERENCES Countries(CountryID),
+            FOREIGN KEY (BrandID) REFERENCES Brands(BrandID)
+        )
+        """)
+
+        conn.commit()
+        logger.info("Tables created successfully")
+    except Exception as e:
+        logger.error(f"Error creating tables: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# Function to save data to the database
+def save_to_db(df, batch_keys=None):
+    """Saves the products in one transaction, returns whether it committed.
+
+    batch_keys are spool batch keys, recorded in SpoolBatches in the same transaction.
+    """
+    # Scraped prices are raw strings ("199,99 €", "N/A"); CurrentPrice is DECIMAL(10, 2)
+    prices, unparseable = normalize_prices(df['Current Price'])
+    if not unparseable.empty:
+        logger.warning(f"Saving {len(unparseable)} records without a price: {unparseable.unique().tolist()}")
+    df = df.assign(**{'Current Price': prices.astype(object).where(prices.notna(), None)})
+
+    try:
+        conn = get_db_connection()
+    except Exception as e:
+        logger.error(f"Error connecting to database: {str(e)}")
+        return False
+    try:
+        # Created, and backfilled from the history, before this batch is part of it
+        run_once(ensure_stock_events, conn)
+    except Exception as e:
+        logger.error(f"Error creating stock events table: {str(e)}")
+    cursor = conn.cursor()
+    try:
+        for _, row in df.iterrows():
+            # Insert or get CountryID
+            cursor.execute("SELECT CountryID FROM Countries WHERE CountryCode = %s", (row['Country'],))
+            result = cursor.fetchone()
+            if result:
+                country_id = result[0]
+            else:
+                cursor.execute("INSERT INTO Countries (CountryCode) VALUES (%s)", (row['Country'],))
+                country_id = cursor.lastrowid
+
+            # Insert or get BrandID
+            cursor.execute("SELECT BrandID FROM Brands WHERE BrandName = %s", (row['Brand'],))
+            result = cursor.fetchone()
+            if result:
+                brand_id = result[0]
+            else:
+                cursor.execute("INSERT INTO Brands (BrandName) VALUES (%s)", (row['Brand'],))
+                brand_id = cursor.lastrowid
+
+            # Insert or get ProductID
+            cursor.execute("SELECT ProductID FROM Products WHERE SKU = %s", (row['SKU'],))
+            result = cursor.fetchone()
+            if result:
+                product_id = result[0]
+            else:
+                cursor.execute("INSERT INTO Products (SKU, ProductName) VALUES (%s, %s)", (row['SKU'], row['Product Name']))
+                product_id = cursor.lastrowid
+
+            # Insert into ProductStatus
+            cursor.execute("""
+            INSERT INTO ProductStatus (ProductID, CountryID, BrandID, Date, Status, Type, CurrentPrice)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (product_id, country_id, brand_id, row['Date'], row['Status'], row['Type'], row['Current Price']))
+
+        if batch_keys:
+            cursor.executemany("INSERT INTO SpoolBatches (BatchKey) VALUES (%s)", [(key,) for key in batch_keys])
+        # Committed with the statuses, so events and ProductStatus cannot disagree
+        events = record_stock_events(conn, df)
+
+        conn.commit()
+        logger.info(f"Successfully saved {len(df)} records to database")
+    except Exception as e:
+        logger.error(f"Error saving data to database: {str(e)}")
+        conn.rollback()
+        return False
+    else:
+        # Price history is derived from the saved batch; a failure here must not undo the statuses
+        try:
+            record_scraped_prices(conn, df)
+        except Exception as e:
+            logger.error(f"Error recording scraped prices: {str(e)}")
+        publish_events(events)
+        try:
+            refresh_daily_availability(conn, df)
+        except Exception as e:
+            logger.error(f"Error refreshing daily availability: {str(e)}")
+        try:
+            record_scraped_urls(conn, df)
+        except Exception as e:
+            logger.error(f"Error recording scraped URLs: {str(e)}")
+        return True
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def extract_id_from_url(url, site=None):
+    """Extracts the SKU from the URL with the SKU rule of its site."""
+    site = site or site_for_url(url)
+    if site is None:
+        return None
+    return site.sku_rule(url)
+
+
+def categorize_url(url):
+    site = site_for_url(url)
+    if site is None:
+        return None, None
+    return site.country, site.brand
+
+
+def group_urls_by_category(urls):
+    grouped_urls = {}
+    for url in urls:
+        country, brand = categorize_url(url)
+        if country and brand:
+            key = f"{country}{brand}"
+            if key not in grouped_urls:
+                grouped_urls[key] = []
+            grouped_urls[key].append(url)
+    return grouped_urls
+
+
+def parse_product(html, url, site, current_date):
+    """Reads a product page; returns the outcome and the product tuple, or None when skipped."""
+    selectors = site.selectors if site else default_selectors
+    soup = BeautifulSoup(html, "html.parser")
+
+    out_of_stock_button = find(soup, selectors['out_of_stock'])
+    product_name_tag = find(soup, selectors['product_name'])
+    price_tag = find(soup, selectors['price'])
+    current_price = price_tag.text.strip() if price_tag else "N/A"
+
+    if not product_name_tag:
+        return "skipped", None
+    product_name = product_name_tag.get_text(strip=True)
+    product_type = "Ninja" if "ninja" in product_name.lower() else "Shark"
+    zid_part = extract_id_from_url(url, site)
+
+    if out_of_stock_button:
+        status = "OUT"
+    else:
+        # Pages without either button have always counted as in stock
+        if not find(soup, selectors['add_to_cart']):
+            logger.debug(f"No stock or cart button on {url}")
+        status = "IN"
+    return status, (zid_part, product_name, current_date, url, status, product_type, current_price)
+
+
+def check_availability(urls, skip_log=None):
+    """Fetches and parses the URLs; returns out of stock products, in stock products and skipped URLs.
+
+    skip_log, when given, gets (url, reason, HTTP status, seconds) of every URL not reported IN or OUT.
+    """
+    out_of_stock_products = []
+    in_stock_products = []
+    skipped_urls = []
+    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timeout_seconds = 5
+
+    with mount_timed_adapter(requests.Session()) as session:
+        for index, url in enumerate(urls, start=1):
+            site = site_for_url(url)
+            country, brand = (site.country, site.brand) if site else (None, None)
+            outcome, status, timings = "error", None, {}
+            reason = None
+            try:
+                start_time = time.time()
+                reset_connection_timings()
+                request_start = time.perf_counter()
+                response = session.get(url, headers=headers, timeout=timeout_seconds, stream=True)
+                ttfb = time.perf_counter() - request_start
+                status = response.status_code
+                response.raise_for_status()
+                html = response.text
+                dns, connect = connection_timings()
+                timings = dict(dns=dns, connect=connect, ttfb=ttfb, total=time.perf_counter() - request_start,
+                               response_bytes=len(response.content))
+                if archive is not None:
+                    archive.record(url, status, response.headers, response.content, response.encoding)
+
+                parse_start = time.perf_counter()
+                outcome, product = parse_product(html, url, site, current_date)
+                timings['parse'] = time.perf_counter() - parse_start
+
+                if outcome == "OUT":
+                    out_of_stock_products.append(product)
+                elif outcome == "IN":
+                    in_stock_products.append(product)
+                else:
+                    reason = "not a product page"
+
+            except Timeout:
+                outcome = "skipped"
+                reason = "timeout"
+                skipped_urls.append(url)
+            except requests.RequestException as e:
+                logger.warning(f"Error fetching {url}: {e}")
+                reason = f"HTTP {status}" if status else type(e).__name__
+
+            slow = time.time() - start_time > timeout_seconds
+            metrics.record(country, brand, urlparse(url).hostname, outcome, status, slow=slow, **timings)
+            logger.info(f"{outcome} {url} (status {status}, {timings.get('total', 0):.2f}s)")
+
+            if slow:
+                skipped_urls.append(url)
+
+            # Slow URLs that were reported IN or OUT are only counted in the metrics
+            if skip_log is not None and outcome not in ("IN", "OUT"):
+                skip_log.append((url, reason, status, timings.get('total')))
+
+    return out_of_stock_products, in_stock_products, skipped_urls
+
+
+def process_urls(urls, existing_products=None, progress=None, skip_log=None):
+    """Checks the URLs one by one, skipping SKUs already in existing_products.
+
+    progress is called as progress(index, total, skipped) before each URL;
+    skip_log is passed on to check_availability.
+    """
+    if existing_products is None:
+        existing_products = set()
+
+    out_of_stock_products = []
+    in_stock_products = []
+    skipped_urls = []
+    total_urls = len(urls)
+
+    for index, url in enumerate(urls, start=1):
+        if progress is not None:
+            progress(index, total_urls, len(skipped_urls))
+
+        result = check_availability([url], skip_log)
+        if result[0]:
+            product = result[0][0]
+            if product[0] not in existing_products:
+                out_of_stock_products.append(product)
+                existing_products.add(product[0])
+        elif result[1]:
+            product = result[1][0]
+            if product[0] not in existing_products:
+                in_stock_products.append(product)
+                existing_products.add(product[0])
+        else:
+            skipped_urls.append(url)
+
+    metrics.export()
+
+    return out_of_stock_products, in_stock_products, skipped_urls, existing_products
+
+
+def to_dataframe(products, country, brand):
+    """Product tuples of one URL group as the frame save_to_db expects."""
+    df = pd.DataFrame(products, columns=PRODUCT_COLUMNS)
+    df['Country'] = country
+    df['Brand'] = brand
+    return df
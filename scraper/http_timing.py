@@ -0,0 +1,105 @@
+"""DNS and connect timings of the scraper's HTTP connections, for scrape_metrics."""
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family, create_connection
+
+# Connection timings of the request in flight on this thread
+_connection_timings = threading.local()
+
+
+def _timed_create_connection(address, timeout, source_address=None, socket_options=None):
+    """urllib3's create_connection, with the name resolution timed apart from the connect."""
+    host, port = address
+    start = time.perf_counter()
+    addresses = socket.getaddrinfo(host.strip('[]'), port, allowed_gai_family(), socket.SOCK_STREAM)
+    _connection_timings.dns = time.perf_counter() - start
+    error = OSError("getaddrinfo returns an empty list")
+    for *_, sockaddr in addresses:
+        try:
+            # A numeric address is not looked up again
+            return create_connection(sockaddr[:2], timeout, source_address, socket_options)
+        except OSError as e:
+            error = e
+    raise error
+
+
+def _timed_new_conn(connection):
+    # Raises the errors urllib3's own _new_conn raises
+    try:
+        return _timed_create_connection((connection._dns_host, connection.port), connection.timeout,
+                                        connection.source_address, connection.socket_options)
+    except socket.gaierror as e:
+        raise NameResolutionError(connection.host, connection, e) from e
+    except socket.timeout as e:
+        raise ConnectTimeoutError(
+            connection, f"Connection to {connection.host} timed out. (connect timeout={connection.timeout})") from e
+    except OSError as e:
+        raise NewConnectionError(connection, f"Failed to establish a new connection: {e}") from e
+
+
+def _timed_connect(connect):
+    start = time.perf_counter()
+    _connection_timings.dns = 0.0
+    connect()
+    # TCP and, for HTTPS, the TLS handshake
+    _connection_timings.connect = time.perf_counter() - start - _connection_timings.dns
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        return _timed_new_conn(self)
+
+    def connect(self):
+        _timed_connect(super().connect)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        return _timed_new_conn(self)
+
+    def connect(self):
+        _timed_connect(super().connect)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Adapter whose new connections report DNS and connect time.
+
+    Requests on a reused keep-alive connection report 0 for both.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+def mount_timed_adapter(session):
+    adapter = TimedHTTPAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def reset_connection_timings():
+    _connection_timings.dns = 0.0
+    _connection_timings.connect = 0.0
+
+
+def connection_timings():
+    return getattr(_connection_timings, 'dns', 0.0), getattr(_connection_timings, 'connect', 0.0)
@@ -0,0 +1,70 @@
+"""Re-parses archived product pages without fetching them.
+
+    python -m scraper.replay --since 2024-06-01 --out replay.csv
+
+Pages come from the archive written with SCRAPE_ARCHIVE_DIR set (or --archive)
+and go through the same parse_product as a live scrape, with the fetch time as
+the status date. The output has the columns save_to_db takes, so corrected
+statuses can be reviewed and loaded in bulk, and a parser bug can be
+reproduced from the exact page that triggered it.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from scraper.archive import ARCHIVE_DIR, HtmlArchive
+from scraper.core import PRODUCT_COLUMNS, parse_product
+from scraper.sites import site_for_url
+
+
+def select_entries(entries, since=None, until=None, url_contains=None):
+    if since is not None:
+        entries = entries[entries['fetched'] >= pd.Timestamp(since)]
+    if until is not None:
+        entries = entries[entries['fetched'] < pd.Timestamp(until)]
+    if url_contains:
+        entries = entries[entries['url'].str.contains(url_contains, regex=False)]
+    return entries
+
+
+def replay(source, entries=None):
+    """Parses archived pages; returns the products as save_to_db takes them and the skipped URLs."""
+    entries = source.entries() if entries is None else entries
+    products, skipped = [], []
+    for entry, html in source.pages(entries):
+        site = site_for_url(entry.url)
+        _, product = parse_product(html, entry.url, site, entry.fetched.strftime("%Y-%m-%d %H:%M:%S"))
+        if product is None:
+            skipped.append(entry.url)
+        else:
+            products.append(product + ((site.country, site.brand) if site else (None, None)))
+    df = pd.DataFrame(products, columns=PRODUCT_COLUMNS + ['Country', 'Brand'])
+    return df.sort_values('Date', kind='stable', ignore_index=True), skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse archived product pages again")
+    parser.add_argument('--archive', default=ARCHIVE_DIR or 'ARCHIVE', help="archive directory")
+    parser.add_argument('--since', help="first fetch date to replay")
+    parser.add_argument('--until', help="fetch date to stop before")
+    parser.add_argument('--url-contains', help="only replay URLs containing this text")
+    parser.add_argument('--out', help="CSV file for the parsed products")
+    args = parser.parse_args(argv)
+
+    source = HtmlArchive(args.archive)
+    entries = select_entries(source.entries(), args.since, args.until, args.url_contains)
+    start = time.perf_counter()
+    df, skipped = replay(source, entries)
+    seconds = time.perf_counter() - start
+
+    print(f"Replayed {len(entries)} pages in {seconds:.1f}s ({len(entries) / max(seconds, 1e-9):.0f} pages/s), "
+          f"{len(skipped)} without a product")
+    if not df.empty:
+        print(df.groupby(['Country', 'Brand', 'Status']).size().unstack(fill_value=0).to_string())
+    if args.out:
+        df.to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Site registry: which market a host belongs to and how to read its pages.
+
+SITES_FILE maps each shop domain to its country, brand, selector profile and
+SKU rule. It is compiled once into a dict keyed by domain, so looking up a URL
+costs one dict hit per label of its hostname. Adding a market only needs new
+entries in the file.
+
+A profile holds BeautifulSoup selectors ({"name", "class", "attrs", "title"})
+for product_name, price, out_of_stock and add_to_cart; a profile only lists the
+selectors that differ from the "default" profile. A SKU rule is either
+{"after": marker}, the rest of the URL after the marker, or {"pattern": regex},
+the first group of the regex.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+from urllib.parse import urlparse
+
+SITES_FILE = os.environ.get('SITE_REGISTRY', os.path.join(os.path.dirname(__file__), 'sites.json'))
+
+Site = namedtuple('Site', ['domain', 'country', 'brand', 'selectors', 'sku_rule'])
+
+
+def _sku_rule(rule):
+    if 'after' in rule:
+        marker = rule['after']
+
+        def extract(url):
+            index = url.find(marker)
+            return url[index + len(marker):] if index >= 0 else None
+    else:
+        pattern = re.compile(rule['pattern'])
+
+        def extract(url):
+            match = pattern.search(url)
+            return match.group(1) if match else None
+    return extract
+
+
+def load_registry(path=SITES_FILE):
+    """Returns the sites by domain and the default selectors for unknown hosts."""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    profiles = config['profiles']
+    registry = {}
+    for domain, site in config['sites'].items():
+        selectors = {**profiles['default'], **profiles[site['profile']]}
+        registry[domain.lower()] = Site(domain.lower(), site['country'], site['brand'], selectors,
+                                        _sku_rule(site['sku']))
+    return registry, profiles['default']
+
+
+registry, default_selectors = load_registry()
+
+
+def site_for_host(host):
+    """The registered site of host or of its closest registered parent domain."""
+    if not host:
+        return None
+    labels = host.lower().rstrip('.').split('.')
+    for start in range(len(labels) - 1):
+        site = registry.get('.'.join(labels[start:]))
+        if site is not None:
+            return site
+    return None
+
+
+def site_for_url(url):
+    return site_for_host(urlparse(url).hostname)
+
+
+def find(soup, selector):
+    attrs = dict(selector.get('attrs', {}))
+    if 'title' in selector:
+        attrs['title'] = selector['title']
+    return soup.find(selector['name'], class_=selector.get('class'), attrs=attrs)
@@ -0,0 +1,311 @@
+"""Durable local spool of scraped results.
+
+The scraper appends every scraped batch to the spool as soon as it is parsed,
+and a SpoolFlusher thread drains the spool to the database with save_to_db.
+A database outage then only delays the writes: batches stay in the spool,
+across restarts too, until a flush succeeds.
+
+Batches are JSON lines appended to segment files of at most SEGMENT_BYTES,
+fsynced every FSYNC_BATCHES batches or FSYNC_SECONDS, whichever comes first.
+A segment is written as .open and renamed to .spool when it is full or the
+spool is closed; open segments of processes on this host that died are
+sealed by the next spool opened on the directory. Each batch carries an
+idempotency key that save_to_db stores in SpoolBatches in the same
+transaction as its rows, so a batch that was written but not marked done
+locally (a crash in between) is skipped by the next flush. Done keys go to a
+.done file per segment; a sealed segment whose batches are all done is
+deleted.
+"""
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+SPOOL_DIR = os.environ.get('SCRAPE_SPOOL_DIR', 'SPOOL')
+SEGMENT_BYTES = 16 * 1024 * 1024
+FSYNC_BATCHES = 20
+FSYNC_SECONDS = 1.0
+
+FLUSH_SECONDS = 5
+FLUSH_MAX_ROWS = 5000
+MAX_RETRY_SECONDS = 300
+# Batches still in a spool after this long could be written twice
+KEY_RETENTION_DAYS = 30
+
+logger = logging.getLogger("scraper")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ResultSpool:
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=SEGMENT_BYTES, fsync_batches=FSYNC_BATCHES,
+                 fsync_seconds=FSYNC_SECONDS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batches = fsync_batches
+        self.fsync_seconds = fsync_seconds
+        self._lock = threading.Lock()
+        self._segment = None
+        self._sequence = 0
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._seal_dead_segments()
+
+    def _path(self, segment, suffix):
+        return os.path.join(self.directory, segment + suffix)
+
+    def _seal_dead_segments(self):
+        # os.kill(pid, 0) would terminate the process on Windows
+        if os.name != 'posix':
+            return
+        host = socket.gethostname()
+        for path in glob.glob(os.path.join(self.directory, '*.open')):
+            segment = os.path.basename(path)[:-len('.open')]
+            prefix, pid, _ = segment.rsplit('-', 2)
+            if prefix.endswith('-' + host) and not _pid_alive(int(pid)):
+                os.replace(path, self._path(segment, '.spool'))
+
+    def _seal(self):
+        if self._file is None:
+            return
+        self._sync()
+        self._file.close()
+        os.replace(self._path(self._segment, '.open'), self._path(self._segment, '.spool'))
+        self._file = None
+
+    def _open_segment(self):
+        self._seal()
+        self._sequence += 1
+        self._segment = f"{datetime.now():%Y%m%d-%H%M%S}-{socket.gethostname()}-{os.getpid()}-{self._sequence:04d}"
+        self._file = open(self._path(self._segment, '.open'), 'ab')
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, df, key=None):
+        """Spools a frame of products as save_to_db takes them; returns the batch key."""
+        key = key or uuid.uuid4().hex
+        line = (json.dumps({'key': key, 'rows': df.to_dict('records')}, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None or self._file.tell() + len(line) > self.segment_bytes:
+                self._open_segment()
+            self._file.write(line)
+            # Visible to the flusher right away, durable at the next fsync
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batches or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self._sync()
+        return key
+
+    def sync(self):
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                self._sync()
+
+    def _done_keys(self, segment):
+        try:
+            with open(self._path(segment, '.done')) as f:
+                return set(f.read().split())
+        except FileNotFoundError:
+            return set()
+
+    def pending(self):
+        """Yields (segment, key, rows) of the batches not written yet, oldest segment first."""
+        paths = glob.glob(os.path.join(self.directory, '*.spool')) + glob.glob(os.path.join(self.directory, '*.open'))
+        for path in sorted(paths, key=os.path.basename):
+            segment = os.path.splitext(os.path.basename(path))[0]
+            done = self._done_keys(segment)
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                # Sealed or removed since the listing
+                continue
+            pending = False
+            with f:
+                for number, line in enumerate(f, start=1):
+                    # A line without newline is being written, or was cut off by a crash
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        logger.error(f"Skipping unreadable line {number} of spool segment {segment}")
+                        continue
+                    if batch['key'] not in done:
+                        pending = True
+                        yield segment, batch['key'], batch['rows']
+            if not pending:
+                self._remove_if_written(segment)
+
+    def mark_done(self, batches):
+        """Records (segment, key) pairs as written and removes sealed segments that are fully written."""
+        keys_by_segment = {}
+        for segment, key in batches:
+            keys_by_segment.setdefault(segment, []).append(key)
+        for segment, keys in keys_by_segment.items():
+            with open(self._path(segment, '.done'), 'a') as f:
+                f.write(''.join(key + '\n' for key in keys))
+                f.flush()
+                os.fsync(f.fileno())
+            self._remove_if_written(segment)
+
+    def _remove_if_written(self, segment):
+        path = self._path(segment, '.spool')
+        if not os.path.exists(path):
+            return
+        done = self._done_keys(segment)
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    if line.endswith(b'\n') and json.loads(line)['key'] not in done:
+                        return
+                except ValueError:
+                    continue
+        try:
+            os.remove(path)
+            os.remove(self._path(segment, '.done'))
+        except OSError as e:
+            # Windows cannot remove a segment pending() still reads; pending() removes it later
+            logger.debug(f"Spool segment {segment} not removed yet: {e}")
+
+    def close(self):
+        with self._lock:
+            self._seal()
+
+
+def ensure_spool_batches(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT OBJECT_ID('SpoolBatches', 'U')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute("""
+        CREATE TABLE SpoolBatches (
+            BatchKey NVARCHAR(64) PRIMARY KEY,
+            WrittenAt DATETIME NOT NULL DEFAULT GETDATE()
+        )
+        """)
+    cursor.execute("DELETE FROM SpoolBatches WHERE WrittenAt < DATEADD(day, -%s, GETDATE())", (KEY_RETENTION_DAYS,))
+    conn.commit()
+    cursor.close()
+
+
+def written_batch_keys(conn, keys):
+    if not keys:
+        return set()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT BatchKey FROM SpoolBatches WHERE BatchKey IN ({', '.join(['%s'] * len(keys))})",
+                   tuple(keys))
+    written = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return written
+
+
+def read_written_keys(keys):
+    """The keys already recorded in SpoolBatches, i.e. of batches a committed save_to_db wrote."""
+    from db import get_db_connection, run_once
+
+    conn = get_db_connection()
+    try:
+        run_once(ensure_spool_batches, conn)
+        return written_batch_keys(conn, keys)
+    finally:
+        conn.close()
+
+
+def _chunks(batches, max_rows):
+    chunk, rows = [], 0
+    for batch in batches:
+        chunk.append(batch)
+        rows += len(batch[2])
+        if rows >= max_rows:
+            yield chunk
+            chunk, rows = [], 0
+    if chunk:
+        yield chunk
+
+
+def flush_spool(spool, save=None, max_rows=FLUSH_MAX_ROWS):
+    """Writes the pending batches in transactions of about max_rows rows.
+
+    Returns (batches written, whether everything pending was written); stops at the first failed write.
+    """
+    from scraper.core import save_to_db
+    save = save or save_to_db
+
+    spool.sync()
+    written = 0
+    for chunk in _chunks(spool.pending(), max_rows):
+        try:
+            already_written = read_written_keys([key for _, key, _ in chunk])
+        except Exception as e:
+            logger.error(f"Error reading written spool batches: {str(e)}")
+            return written, False
+        new = [batch for batch in chunk if batch[1] not in already_written]
+        frames = [pd.DataFrame(rows) for _, _, rows in new if rows]
+        if frames:
+            # A failing save must not end the flusher thread, the batches are retried
+            try:
+                saved = save(pd.concat(frames, ignore_index=True), batch_keys=[key for _, key, _ in new])
+            except Exception as e:
+                logger.error(f"Error writing spool batches: {str(e)}")
+                saved = False
+            if not saved:
+                return written, False
+        spool.mark_done([(segment, key) for segment, key, _ in chunk])
+        written += len(chunk)
+    return written, True
+
+
+class SpoolFlusher(threading.Thread):
+    """Drains the spool every interval seconds, backing off while the database fails."""
+
+    def __init__(self, spool, save=None, interval=FLUSH_SECONDS, max_rows=FLUSH_MAX_ROWS):
+        super().__init__(name='spool-flusher', daemon=True)
+        self.spool = spool
+        self.save = save
+        self.interval = interval
+        self.max_rows = max_rows
+        self.stopping = threading.Event()
+        self.written = 0
+
+    def flush(self):
+        written, ok = flush_spool(self.spool, self.save, self.max_rows)
+        self.written += written
+        return ok
+
+    def run(self):
+        delay = self.interval
+        while not self.stopping.wait(delay):
+            delay = self.interval if self.flush() else min(delay * 2, MAX_RETRY_SECONDS)
+            if delay > self.interval:
+                logger.warning(f"Spool flush failed, retrying in {delay}s")
+
+    def stop(self, attempts=3):
+        """Stops the thread, then flushes what is left; returns whether the spool is empty."""
+        self.stopping.set()
+        self.join()
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(min(self.interval * 2 ** attempt, MAX_RETRY_SECONDS))
+            if self.flush():
+                return True
+        return False
@@ -0,0 +1,161 @@
+"""URL-to-SKU canonicalization index.
+
+UrlIndex maps every URL of the urls table to its canonical URL (no tracking
+parameters, fragment or trailing slash) and to its SKU and market. The SKU is
+first taken from the stored URL with the site's SKU rule and replaced by the
+SKU a scrape of one of the URLs sharing its canonical URL actually found. The
+canonical URL is only a deduplication key: schedule_urls() uses the index to
+fetch each SKU once per market per run, however many variant URLs point to it,
+but always fetches a URL as stored so SKUs match the earlier scrapes.
+"""
+import logging
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import pandas as pd
+
+from db import run_once
+from scraper.sites import site_for_url
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga')
+
+# Width of the Url and CanonicalUrl columns, as of urls.url
+URL_LENGTH = 255
+
+URL_SOURCE = 'url'
+SCRAPED_SOURCE = 'scraped'
+
+
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(TRACKING_PARAMS)]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/') or '/',
+                       urlencode(sorted(query)), ''))
+
+
+def index_entry(url):
+    """(Url, CanonicalUrl, SKU, CountryCode, BrandName) derived from the URL alone."""
+    canonical = canonical_url(url)
+    # Re-encoding the query can lengthen it; such a URL is only deduplicated by its SKU
+    if len(canonical) > URL_LENGTH:
+        canonical = url
+    site = site_for_url(url)
+    if site is None:
+        return url, canonical, None, None, None
+    return url, canonical, site.sku_rule(url), site.country, site.brand
+
+
+def ensure_url_index(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT OBJECT_ID('UrlIndex', 'U')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute("""
+        CREATE TABLE UrlIndex (
+            Url VARCHAR(255) PRIMARY KEY,
+            CanonicalUrl VARCHAR(255) NOT NULL,
+            SKU NVARCHAR(50),
+            CountryCode NVARCHAR(2),
+            BrandName NVARCHAR(50),
+            Source NVARCHAR(10) NOT NULL,
+            UpdatedAt DATETIME NOT NULL,
+            INDEX IX_UrlIndex_Canonical (CanonicalUrl)
+        )
+        """)
+        conn.commit()
+    cursor.close()
+
+
+def sync_url_index(conn):
+    """Brings UrlIndex in line with the urls table, keeping SKUs found by scrapes."""
+    run_once(ensure_url_index, conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT url FROM urls")
+        entries = [index_entry(row[0]) for row in cursor.fetchall()]
+
+        cursor.execute("IF OBJECT_ID('tempdb..#UrlIndexSource') IS NOT NULL DROP TABLE #UrlIndexSource")
+        cursor.execute("""
+        CREATE TABLE #UrlIndexSource (
+            Url VARCHAR(255) PRIMARY KEY,
+            CanonicalUrl VARCHAR(255),
+            SKU NVARCHAR(50),
+            CountryCode NVARCHAR(2),
+            BrandName NVARCHAR(50)
+        )
+        """)
+        if entries:
+            cursor.executemany("INSERT INTO #UrlIndexSource VALUES (%s, %s, %s, %s, %s)", entries)
+        # A scraped SKU stays valid as long as the URL still canonicalizes the same way
+        cursor.execute("""
+        MERGE INTO UrlIndex AS target
+        USING #UrlIndexSource AS source
+        ON target.Url = source.Url
+        WHEN MATCHED AND (target.CanonicalUrl <> source.CanonicalUrl OR target.Source = %s) THEN
+            UPDATE SET CanonicalUrl = source.CanonicalUrl, SKU = source.SKU, CountryCode = source.CountryCode,
+                       BrandName = source.BrandName, Source = %s, UpdatedAt = GETDATE()
+        WHEN NOT MATCHED THEN
+            INSERT (Url, CanonicalUrl, SKU, CountryCode, BrandName, Source, UpdatedAt)
+            VALUES (source.Url, source.CanonicalUrl, source.SKU, source.CountryCode, source.BrandName, %s, GETDATE())
+        WHEN NOT MATCHED BY SOURCE THEN
+            DELETE;
+        """, (URL_SOURCE, URL_SOURCE, URL_SOURCE))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def load_url_index(conn):
+    return pd.read_sql("SELECT Url, CanonicalUrl, SKU, CountryCode, BrandName, Source FROM UrlIndex", conn)
+
+
+def schedule_urls(conn):
+    """Stored URLs to scrape this run, one per SKU and market.
+
+    URLs whose SKU is not known yet are deduplicated by canonical URL, URLs of
+    unregistered sites are left out like group_urls_by_category does.
+    """
+    sync_url_index(conn)
+    index = load_url_index(conn).sort_values('Url')
+    index = index[index['CountryCode'].notna()]
+    key = index['SKU'].where(index['SKU'].notna(), index['CanonicalUrl'])
+    # Prefer URLs whose SKU a scrape confirmed
+    index = (index.assign(Key=key, Scraped=index['Source'] == SCRAPED_SOURCE)
+             .sort_values('Scraped', ascending=False, kind='stable')
+             .drop_duplicates(subset=['CountryCode', 'Key']))
+    logger.info(f"Scheduling {len(index)} of {len(key)} URLs after canonicalization")
+    return index['Url'].tolist()
+
+
+def record_scraped_urls(conn, df):
+    """Stores the SKUs a scrape found for the URLs it fetched and their variants."""
+    scraped = df[['URL', 'SKU']].dropna().drop_duplicates(subset='URL', keep='last')
+    if scraped.empty:
+        return 0
+
+    run_once(ensure_url_index, conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#ScrapedUrls') IS NOT NULL DROP TABLE #ScrapedUrls")
+        cursor.execute("CREATE TABLE #ScrapedUrls (Url VARCHAR(255), SKU NVARCHAR(50))")
+        cursor.executemany("INSERT INTO #ScrapedUrls VALUES (%s, %s)", scraped.values.tolist())
+        cursor.execute("""
+        UPDATE u
+        SET SKU = s.SKU, Source = %s, UpdatedAt = GETDATE()
+        FROM UrlIndex u
+        JOIN UrlIndex fetched ON fetched.CanonicalUrl = u.CanonicalUrl
+        JOIN #ScrapedUrls s ON fetched.Url = s.Url
+        WHERE u.Source <> %s OR u.SKU IS NULL OR u.SKU <> s.SKU
+        """, (SCRAPED_SOURCE, SCRAPED_SOURCE))
+        updated = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return updated
@@ -0,0 +1,242 @@
+"""Lease-based work queue for running the scrape on several workers.
+
+A run is enqueued as tasks of at most batch_size URLs, each from a single
+group_urls_by_category group and host. Workers claim pending tasks with a lease
+that they extend by heartbeating while they work; when a worker dies its lease
+expires and another worker claims the task again. A task is completed, and its
+results stored, in one transaction that only succeeds while the worker still
+holds the lease, so a task that was re-claimed is never written twice. Lease
+times are seconds since the epoch on the database's clock, so clock skew
+between worker machines cannot end a live lease early or keep a dead one.
+
+SqlServerWorkQueue runs on the app database, SqliteWorkQueue on a local file
+for trying things out on one machine.
+"""
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlparse
+
+from scraper.core import group_urls_by_category
+
+LEASE_SECONDS = 120
+BATCH_SIZE = 25
+# Tasks that lost their lease this often are left alone
+MAX_ATTEMPTS = 3
+
+
+def partition_urls(urls, batch_size=BATCH_SIZE):
+    """Yields (group key, host, urls) batches."""
+    for key, group_urls in group_urls_by_category(urls).items():
+        by_host = defaultdict(list)
+        for url in group_urls:
+            by_host[urlparse(url).hostname].append(url)
+        for host, host_urls in by_host.items():
+            for start in range(0, len(host_urls), batch_size):
+                yield key, host, host_urls[start:start + batch_size]
+
+
+class WorkQueue:
+    placeholder = '%s'
+    # SQL expression for the current time in seconds since the epoch
+    clock = None
+
+    def __init__(self):
+        # Connections are not shared between threads, e.g. the heartbeat thread
+        self._local = threading.local()
+
+    def connect(self):
+        raise NotImplementedError
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    def _execute(self, statement, params=()):
+        cursor = self._conn().cursor()
+        cursor.execute(statement.replace('%s', self.placeholder), params)
+        return cursor
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def create_tables(self):
+        raise NotImplementedError
+
+    def _claim(self, run_id, owner, n, lease_seconds):
+        raise NotImplementedError
+
+    def enqueue_run(self, urls, batch_size=BATCH_SIZE, run_id=None):
+        run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        rows = [(run_id, key, host, json.dumps(batch))
+                for key, host, batch in partition_urls(urls, batch_size)]
+        cursor = self._conn().cursor()
+        cursor.executemany(f"""
+        INSERT INTO ScrapeQueue (RunID, GroupKey, Host, Urls, Status, Attempts)
+        VALUES ({self.placeholder}, {self.placeholder}, {self.placeholder}, {self.placeholder}, 'pending', 0)
+        """, rows)
+        self._conn().commit()
+        return run_id, len(rows)
+
+    def claim(self, run_id, owner, n=1, lease_seconds=LEASE_SECONDS):
+        """Leases up to n pending or expired tasks as [(task id, group key, host, urls)]."""
+        rows = self._claim(run_id, owner, n, lease_seconds)
+        self._conn().commit()
+        return [(task_id, key, host, json.loads(urls)) for task_id, key, host, urls in rows]
+
+    def heartbeat(self, owner, lease_seconds=LEASE_SECONDS):
+        """Extends all leases of owner, returns how many it still holds."""
+        cursor = self._execute(f"""
+        UPDATE ScrapeQueue SET LeaseExpires = {self.clock} + %s
+        WHERE LeaseOwner = %s AND Status = 'leased'
+        """, (lease_seconds, owner))
+        self._conn().commit()
+        return cursor.rowcount
+
+    def complete(self, task_id, owner, results):
+        """Marks the task done and stores results, unless owner lost the lease."""
+        cursor = self._execute("""
+        UPDATE ScrapeQueue SET Status = 'done', LeaseExpires = NULL
+        WHERE TaskID = %s AND LeaseOwner = %s AND Status = 'leased'
+        """, (task_id, owner))
+        if cursor.rowcount != 1:
+            self._conn().rollback()
+            return False
+        self._execute("""
+        INSERT INTO ScrapeResults (TaskID, RunID, Payload, Written)
+        SELECT TaskID, RunID, %s, 0 FROM ScrapeQueue WHERE TaskID = %s
+        """, (json.dumps(results), task_id))
+        self._conn().commit()
+        return True
+
+    def unwritten_results(self, run_id):
+        cursor = self._execute("""
+        SELECT TaskID, Payload FROM ScrapeResults WHERE RunID = %s AND Written = 0 ORDER BY TaskID
+        """, (run_id,))
+        return [(task_id, json.loads(payload)) for task_id, payload in cursor.fetchall()]
+
+    def mark_written(self, task_ids):
+        cursor = self._conn().cursor()
+        cursor.executemany(
+            f"UPDATE ScrapeResults SET Written = 1 WHERE TaskID = {self.placeholder}",
+            [(task_id,) for task_id in task_ids])
+        self._conn().commit()
+
+    def remaining(self, run_id):
+        """Task counts per status; tasks out of attempts are counted as 'failed'."""
+        cursor = self._execute("""
+        SELECT CASE WHEN Status <> 'done' AND Attempts >= %s THEN 'failed' ELSE Status END, COUNT(*)
+        FROM ScrapeQueue WHERE RunID = %s
+        GROUP BY CASE WHEN Status <> 'done' AND Attempts >= %s THEN 'failed' ELSE Status END
+        """, (MAX_ATTEMPTS, run_id, MAX_ATTEMPTS))
+        return dict(cursor.fetchall())
+
+
+class SqlServerWorkQueue(WorkQueue):
+    clock = "DATEDIFF_BIG(millisecond, '19700101', SYSUTCDATETIME()) / 1000.0"
+
+    def connect(self):
+        from db import get_db_connection
+        return get_db_connection()
+
+    def create_tables(self):
+        self._execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ScrapeQueue' and xtype='U')
+        CREATE TABLE ScrapeQueue (
+            TaskID INT IDENTITY(1,1) PRIMARY KEY,
+            RunID NVARCHAR(32) NOT NULL,
+            GroupKey NVARCHAR(20) NOT NULL,
+            Host NVARCHAR(255) NOT NULL,
+            Urls NVARCHAR(MAX) NOT NULL,
+            Status NVARCHAR(10) NOT NULL,
+            LeaseOwner NVARCHAR(100),
+            LeaseExpires FLOAT,
+            Attempts INT NOT NULL,
+            INDEX IX_ScrapeQueue_Run (RunID, Status)
+        )
+        """)
+        self._execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ScrapeResults' and xtype='U')
+        CREATE TABLE ScrapeResults (
+            TaskID INT PRIMARY KEY,
+            RunID NVARCHAR(32) NOT NULL,
+            Payload NVARCHAR(MAX) NOT NULL,
+            Written BIT NOT NULL,
+            INDEX IX_ScrapeResults_Run (RunID, Written)
+        )
+        """)
+        self._conn().commit()
+
+    def _claim(self, run_id, owner, n, lease_seconds):
+        # READPAST skips rows another worker is claiming right now instead of waiting for them
+        cursor = self._execute(f"""
+        WITH next AS (
+            SELECT TOP (%s) *
+            FROM ScrapeQueue WITH (UPDLOCK, READPAST, ROWLOCK)
+            WHERE RunID = %s AND Attempts < %s
+              AND (Status = 'pending' OR (Status = 'leased' AND LeaseExpires < {self.clock}))
+            ORDER BY TaskID
+        )
+        UPDATE next SET Status = 'leased', LeaseOwner = %s, LeaseExpires = {self.clock} + %s, Attempts = Attempts + 1
+        OUTPUT inserted.TaskID, inserted.GroupKey, inserted.Host, inserted.Urls
+        """, (n, run_id, MAX_ATTEMPTS, owner, lease_seconds))
+        return cursor.fetchall()
+
+
+class SqliteWorkQueue(WorkQueue):
+    placeholder = '?'
+    # The local clock, as the database file is on this machine
+    clock = "(julianday('now') - 2440587.5) * 86400.0"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_tables(self):
+        self._conn().executescript("""
+        CREATE TABLE IF NOT EXISTS ScrapeQueue (
+            TaskID INTEGER PRIMARY KEY AUTOINCREMENT,
+            RunID TEXT NOT NULL,
+            GroupKey TEXT NOT NULL,
+            Host TEXT NOT NULL,
+            Urls TEXT NOT NULL,
+            Status TEXT NOT NULL,
+            LeaseOwner TEXT,
+            LeaseExpires REAL,
+            Attempts INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS IX_ScrapeQueue_Run ON ScrapeQueue (RunID, Status);
+        CREATE TABLE IF NOT EXISTS ScrapeResults (
+            TaskID INTEGER PRIMARY KEY,
+            RunID TEXT NOT NULL,
+            Payload TEXT NOT NULL,
+            Written INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS IX_ScrapeResults_Run ON ScrapeResults (RunID, Written);
+        """)
+
+    def _claim(self, run_id, owner, n, lease_seconds):
+        # SQLite holds one write lock per database, so the UPDATE itself is atomic
+        cursor = self._execute(f"""
+        UPDATE ScrapeQueue SET Status = 'leased', LeaseOwner = %s, LeaseExpires = {self.clock} + %s,
+            Attempts = Attempts + 1
+        WHERE TaskID IN (
+            SELECT TaskID FROM ScrapeQueue
+            WHERE RunID = %s AND Attempts < %s
+              AND (Status = 'pending' OR (Status = 'leased' AND LeaseExpires < {self.clock}))
+            ORDER BY TaskID
+            LIMIT %s
+        )
+        RETURNING TaskID, GroupKey, Host, Urls
+        """, (owner, lease_seconds, run_id, MAX_ATTEMPTS, n))
+        return cursor.fetchall()
@@ -0,0 +1,236 @@
+"""Scrape workers and the result writer for the work queue.
+
+    python -m scraper.worker enqueue               # prints the run id
+    python -m scraper.worker work RUN_ID           # on every worker VM
+    python -m scraper.worker write RUN_ID --follow # once, next to the database
+
+Pass --queue PATH to every command to use a local SQLite queue instead of the
+app database. Without a queue, one process can scrape the urls table through
+the local spool, so a database outage delays the writes instead of failing
+them:
+
+    python -m scraper.worker scrape   # writes in the background while scraping
+    python -m scraper.worker flush    # writes what an earlier run left in the spool
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from logging_setup import setup_logging
+from run_store import RunWriter
+from scraper.core import categorize_url, group_urls_by_category, process_urls, save_to_db, to_dataframe
+from scraper.spool import SPOOL_DIR, ResultSpool, SpoolFlusher, flush_spool, read_written_keys
+from scraper.url_index import schedule_urls
+from scraper.work_queue import (BATCH_SIZE, LEASE_SECONDS, SqliteWorkQueue, SqlServerWorkQueue)
+
+logger = logging.getLogger("scraper")
+
+POLL_SECONDS = 5
+
+
+def default_owner():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def scrape_task(urls):
+    """Scrapes one task's URLs into the payload the writer saves."""
+    skip_log = []
+    start = time.perf_counter()
+    out_of_stock, in_stock, skipped, _ = process_urls(urls, skip_log=skip_log)
+    country, brand = categorize_url(urls[0])
+    products = to_dataframe(out_of_stock + in_stock, country, brand)
+    return {'products': products.to_dict('records'), 'skipped': skipped, 'country': country, 'brand': brand,
+            'skip_log': skip_log, 'seconds': time.perf_counter() - start}
+
+
+def _keep_leases(queue, owner, lease_seconds, stop):
+    while not stop.wait(lease_seconds / 3):
+        try:
+            queue.heartbeat(owner, lease_seconds)
+        except Exception as e:
+            logger.warning(f"Heartbeat failed for {owner}: {e}")
+    queue.close()
+
+
+def run_worker(queue, run_id, owner=None, lease_seconds=LEASE_SECONDS, scrape=scrape_task):
+    """Claims and scrapes tasks until the run has none left, returns how many it completed."""
+    owner = owner or default_owner()
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_keep_leases, args=(queue, owner, lease_seconds, stop), daemon=True)
+    heartbeat.start()
+    completed = 0
+    try:
+        while True:
+            tasks = queue.claim(run_id, owner, lease_seconds=lease_seconds)
+            if not tasks:
+                # Leased tasks may still come back when their worker dies
+                if not queue.remaining(run_id).get('leased'):
+                    break
+                time.sleep(POLL_SECONDS)
+                continue
+            for task_id, key, host, urls in tasks:
+                logger.info(f"{owner} scraping task {task_id} ({key}, {host}, {len(urls)} URLs)")
+                results = scrape(urls)
+                if queue.complete(task_id, owner, results):
+                    completed += 1
+                else:
+                    logger.warning(f"{owner} lost the lease on task {task_id}, its results are dropped")
+    finally:
+        stop.set()
+        heartbeat.join()
+    return completed
+
+
+def task_batch_key(run_id, task_id):
+    return f"queue:{run_id}:{task_id}"
+
+
+def write_results(queue, run_id, save=save_to_db, run=None):
+    """Saves all unwritten results of the run in one batch, returns the number of rows saved.
+
+    Each task's key goes to SpoolBatches in the save's transaction, so results that were saved
+    but not marked written (a crash or error in between) are not saved again. Once saved, the
+    results are also added to the run store through run, a RunWriter.
+    """
+    results = queue.unwritten_results(run_id)
+    if not results:
+        return 0
+    try:
+        already_written = read_written_keys([task_batch_key(run_id, task_id) for task_id, _ in results])
+    except Exception as e:
+        logger.error(f"Error reading written tasks: {str(e)}")
+        return 0
+    new = [(task_id, payload) for task_id, payload in results
+           if task_batch_key(run_id, task_id) not in already_written]
+    frames = [pd.DataFrame(payload['products']) for _, payload in new if payload['products']]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not df.empty:
+        # The same product can be listed under several URLs
+        df = df.drop_duplicates(subset=['SKU', 'Country'])
+        if not save(df, batch_keys=[task_batch_key(run_id, task_id) for task_id, _ in new]):
+            return 0
+    if run is not None:
+        for _, payload in new:
+            # Payloads of workers from before the run store carry no market
+            if 'country' in payload:
+                run.add(payload['country'], payload['brand'], pd.DataFrame(payload['products']),
+                        payload['skip_log'], payload['seconds'])
+    queue.mark_written([task_id for task_id, _ in results])
+    return len(df)
+
+
+def run_writer(queue, run_id, follow=False):
+    run = RunWriter(run_id, source='queue')
+    written = write_results(queue, run_id, run=run)
+    while follow and set(queue.remaining(run_id)) - {'done', 'failed'}:
+        time.sleep(POLL_SECONDS)
+        written += write_results(queue, run_id, run=run)
+    if follow:
+        written += write_results(queue, run_id, run=run)
+    run.finish()
+    return written
+
+
+def scrape_to_spool(spool, urls, batch_size=BATCH_SIZE, run=None):
+    """Scrapes the URLs in batches per market, spooling each batch's products as soon as it is parsed.
+
+    Each batch is also added to the run store through run, a RunWriter.
+    """
+    for key, group in group_urls_by_category(urls).items():
+        country, brand = categorize_url(group[0])
+        # The same product can be listed under several URLs of a market
+        existing_products = set()
+        for start in range(0, len(group), batch_size):
+            skip_log = []
+            batch_start = time.perf_counter()
+            out_of_stock, in_stock, skipped, existing_products = process_urls(
+                group[start:start + batch_size], existing_products, skip_log=skip_log)
+            products = to_dataframe(out_of_stock + in_stock, country, brand)
+            if not products.empty:
+                spool.append(products)
+            if run is not None:
+                run.add(country, brand, products, skip_log, time.perf_counter() - batch_start)
+            logger.info(f"Spooled {len(products)} products of {key} ({len(skipped)} URLs skipped)")
+
+
+def run_spooled_scrape(spool_dir=SPOOL_DIR):
+    """Scrapes the scheduled URLs while a flusher writes them; returns whether all results were written."""
+    spool = ResultSpool(spool_dir)
+    run = RunWriter()
+    flusher = SpoolFlusher(spool)
+    flusher.start()
+    urls = None
+    try:
+        urls = get_scheduled_urls()
+        scrape_to_spool(spool, urls, run=run)
+    finally:
+        spool.close()
+        flushed = flusher.stop()
+        run.finish(urls=len(urls) if urls is not None else None)
+    logger.info(f"Wrote {flusher.written} spooled batches"
+                + ("" if flushed else f", the rest stays in {spool_dir} for the next run"))
+    return flushed
+
+
+def get_scheduled_urls():
+    from db import get_db_connection
+    conn = get_db_connection()
+    try:
+        return schedule_urls(conn)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed scrape over a shared work queue")
+    parser.add_argument('--queue', help="SQLite file to use as the queue instead of the app database")
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue = commands.add_parser('enqueue', help="queue the urls table, one URL per SKU and market, as a new run")
+    enqueue.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    work = commands.add_parser('work', help="scrape tasks of a run until none are left")
+    work.add_argument('run_id')
+    work.add_argument('--lease-seconds', type=int, default=LEASE_SECONDS)
+    write = commands.add_parser('write', help="save the results of a run to the database")
+    write.add_argument('run_id')
+    write.add_argument('--follow', action='store_true', help="keep writing until the run is finished")
+    scrape = commands.add_parser('scrape', help="scrape the urls table in this process through the local spool")
+    flush = commands.add_parser('flush', help="write the batches left in the local spool")
+    for command in (scrape, flush):
+        command.add_argument('--spool', default=SPOOL_DIR, help="spool directory (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if args.command == 'scrape':
+        return 0 if run_spooled_scrape(args.spool) else 1
+    if args.command == 'flush':
+        spool = ResultSpool(args.spool)
+        written, flushed = flush_spool(spool)
+        spool.close()
+        logger.info(f"Wrote {written} spooled batches" + ("" if flushed else ", the write failed"))
+        return 0 if flushed else 1
+
+    queue = SqliteWorkQueue(args.queue) if args.queue else SqlServerWorkQueue()
+    queue.create_tables()
+    try:
+        if args.command == 'enqueue':
+            run_id, tasks = queue.enqueue_run(get_scheduled_urls(), args.batch_size)
+            logger.info(f"Enqueued run {run_id} with {tasks} tasks")
+            print(run_id)
+        elif args.command == 'work':
+            completed = run_worker(queue, args.run_id, lease_seconds=args.lease_seconds)
+            logger.info(f"Worker finished after {completed} tasks of run {args.run_id}")
+        else:
+            written = run_writer(queue, args.run_id, follow=args.follow)
+            logger.info(f"Wrote {written} records of run {args.run_id}")
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,201 @@
+"""Stock transition events derived from scrape batches.
+
+Each batch saved by the scraper is diffed against the last StockEvents status
+and price per (SKU, country), in the transaction that saves its ProductStatus
+rows, and every transition is written to StockEvents: 'OUT' when a product
+goes out of stock (or is first seen out of stock), 'IN' when it comes back and
+'PRICE' when its scraped price changes. As the events commit with the statuses,
+IN and OUT events alternate per SKU and country whichever process wrote them,
+and readers get the changes without scanning the ProductStatus history.
+Events can also be appended to a local JSON-lines file or posted to a webhook.
+"""
+import json
+import logging
+import os
+
+import pandas as pd
+
+from price_parser import normalize_prices
+
+EVENTS_FILE = os.environ.get('STOCK_EVENTS_FILE')
+EVENTS_WEBHOOK = os.environ.get('STOCK_EVENTS_WEBHOOK')
+
+KEY = ['SKU', 'Country']
+STATUSES = ('IN', 'OUT')
+EVENT_COLUMNS = ['SKU', 'Country', 'Brand', 'EventDate', 'EventType', 'PreviousStatus', 'Status', 'PreviousPrice',
+                 'Price']
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_stock_events(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT OBJECT_ID('StockEvents', 'U')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute("""
+        CREATE TABLE StockEvents (
+            EventID INT IDENTITY(1,1) PRIMARY KEY,
+            ProductID INT NOT NULL,
+            CountryID INT NOT NULL,
+            BrandID INT NOT NULL,
+            EventDate DATETIME NOT NULL,
+            EventType NVARCHAR(5) NOT NULL,
+            PreviousStatus NVARCHAR(10),
+            Status NVARCHAR(10),
+            PreviousPrice DECIMAL(10, 2),
+            Price DECIMAL(10, 2),
+            FOREIGN KEY (ProductID) REFERENCES Products(ProductID),
+            FOREIGN KEY (CountryID) REFERENCES Countries(CountryID),
+            FOREIGN KEY (BrandID) REFERENCES Brands(BrandID),
+            INDEX IX_StockEvents_Market (CountryID, BrandID, EventDate)
+        )
+        """)
+        # Backfill from the existing history once
+        cursor.execute("""
+        WITH ordered AS (
+            SELECT
+                ProductID, CountryID, BrandID, Date, Status, CurrentPrice,
+                LAG(Status) OVER (PARTITION BY ProductID, CountryID, BrandID ORDER BY Date, StatusID) AS PreviousStatus,
+                LAG(CurrentPrice) OVER (PARTITION BY ProductID, CountryID, BrandID ORDER BY Date, StatusID) AS PreviousPrice
+            FROM ProductStatus
+            WHERE Status IN ('IN', 'OUT')
+        )
+        INSERT INTO StockEvents (ProductID, CountryID, BrandID, EventDate, EventType, PreviousStatus, Status, PreviousPrice, Price)
+        SELECT ProductID, CountryID, BrandID, Date, Status, PreviousStatus, Status, PreviousPrice, CurrentPrice
+        FROM ordered
+        WHERE Status <> ISNULL(PreviousStatus, 'IN')
+        UNION ALL
+        SELECT ProductID, CountryID, BrandID, Date, 'PRICE', PreviousStatus, Status, PreviousPrice, CurrentPrice
+        FROM ordered
+        WHERE CurrentPrice <> PreviousPrice
+        """)
+        conn.commit()
+    # Each batch diffs its keys against their last event and last saved status
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_StockEvents_Product')
+    CREATE INDEX IX_StockEvents_Product ON StockEvents (ProductID, CountryID, EventDate)
+    INCLUDE (EventType, Status, Price)
+    """)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_ProductStatus_Product')
+    CREATE INDEX IX_ProductStatus_Product ON ProductStatus (ProductID, CountryID, Date)
+    INCLUDE (Status, CurrentPrice)
+    """)
+    conn.commit()
+    cursor.close()
+
+
+def record_stock_events(conn, df):
+    """Writes the transitions of a batch whose ProductStatus rows are saved in the open transaction.
+
+    The caller commits or rolls back. Returns the events, to publish once committed.
+    """
+    batch = pd.DataFrame({
+        'SKU': df['SKU'],
+        'Country': df['Country'],
+        'Brand': df['Brand'],
+        'EventDate': pd.to_datetime(df['Date']),
+        'Status': df['Status'],
+        'Price': normalize_prices(df['Current Price'])[0],
+    }).dropna(subset=['SKU'])
+    batch = batch[batch['Status'].isin(STATUSES)].drop_duplicates(subset=KEY, keep='last')
+    if batch.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    rows = batch.astype(object).where(batch.notna(), None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#StockBatch') IS NOT NULL DROP TABLE #StockBatch")
+        cursor.execute("""
+        CREATE TABLE #StockBatch (
+            SKU NVARCHAR(50),
+            CountryCode NVARCHAR(2),
+            BrandName NVARCHAR(50),
+            EventDate DATETIME,
+            Status NVARCHAR(10),
+            Price DECIMAL(10, 2)
+        )
+        """)
+        cursor.executemany("INSERT INTO #StockBatch VALUES (%s, %s, %s, %s, %s, %s)", rows.values.tolist())
+        cursor.execute("IF OBJECT_ID('tempdb..#NewStockEvents') IS NOT NULL DROP TABLE #NewStockEvents")
+        # The locks keep a concurrent writer from diffing against the same last event; a key without a
+        # priced event takes its previous price from the saved history before this batch
+        cursor.execute("""
+        WITH batch AS (
+            SELECT pr.ProductID, c.CountryID, b.BrandID, s.SKU, s.CountryCode, s.BrandName, s.EventDate, s.Status,
+                   s.Price
+            FROM #StockBatch s
+            JOIN Products pr ON pr.SKU = s.SKU
+            JOIN Countries c ON c.CountryCode = s.CountryCode
+            JOIN Brands b ON b.BrandName = s.BrandName
+        ), previous AS (
+            SELECT batch.*, last_status.Status AS PreviousStatus,
+                   ISNULL(last_price.Price, last_saved.CurrentPrice) AS PreviousPrice
+            FROM batch
+            OUTER APPLY (
+                SELECT TOP 1 e.Status
+                FROM StockEvents e WITH (UPDLOCK, HOLDLOCK)
+                WHERE e.ProductID = batch.ProductID AND e.CountryID = batch.CountryID AND e.EventType IN ('IN', 'OUT')
+                ORDER BY e.EventDate DESC, e.EventID DESC
+            ) last_status
+            OUTER APPLY (
+                SELECT TOP 1 e.Price
+                FROM StockEvents e WITH (UPDLOCK, HOLDLOCK)
+                WHERE e.ProductID = batch.ProductID AND e.CountryID = batch.CountryID AND e.Price IS NOT NULL
+                ORDER BY e.EventDate DESC, e.EventID DESC
+            ) last_price
+            OUTER APPLY (
+                SELECT TOP 1 ps.CurrentPrice
+                FROM ProductStatus ps
+                WHERE ps.ProductID = batch.ProductID AND ps.CountryID = batch.CountryID
+                    AND ps.Status IN ('IN', 'OUT') AND ps.CurrentPrice IS NOT NULL AND ps.Date < batch.EventDate
+                ORDER BY ps.Date DESC, ps.StatusID DESC
+            ) last_saved
+        )
+        SELECT ProductID, CountryID, BrandID, SKU, CountryCode, BrandName, EventDate, Status AS EventType,
+               PreviousStatus, Status, PreviousPrice, Price
+        INTO #NewStockEvents
+        FROM previous
+        WHERE Status <> ISNULL(PreviousStatus, 'IN')
+        UNION ALL
+        SELECT ProductID, CountryID, BrandID, SKU, CountryCode, BrandName, EventDate, 'PRICE',
+               PreviousStatus, Status, PreviousPrice, Price
+        FROM previous
+        WHERE Price <> PreviousPrice
+        """)
+        cursor.execute("""
+        INSERT INTO StockEvents (ProductID, CountryID, BrandID, EventDate, EventType, PreviousStatus, Status, PreviousPrice, Price)
+        SELECT ProductID, CountryID, BrandID, EventDate, EventType, PreviousStatus, Status, PreviousPrice, Price
+        FROM #NewStockEvents
+        """)
+    finally:
+        cursor.close()
+    events = pd.read_sql("""
+    SELECT SKU, CountryCode AS Country, BrandName AS Brand, EventDate, EventType, PreviousStatus, Status,
+           PreviousPrice, Price
+    FROM #NewStockEvents
+    """, conn)
+    events[['PreviousPrice', 'Price']] = events[['PreviousPrice', 'Price']].astype(float)
+    if not events.empty:
+        logger.info(f"Recorded {len(events)} stock events")
+    return events
+
+
+def publish_events(events):
+    """Sends events to the optional file and webhook sinks; failures are only logged."""
+    if events.empty or (not EVENTS_FILE and not EVENTS_WEBHOOK):
+        return
+    records = json.loads(events.to_json(orient='records', date_format='iso'))
+    if EVENTS_FILE:
+        try:
+            with open(EVENTS_FILE, 'a') as f:
+                f.writelines(json.dumps(record) + '\n' for record in records)
+        except OSError as e:
+            logger.error(f"Error writing stock events to {EVENTS_FILE}: {e}")
+    if EVENTS_WEBHOOK:
+        # Imported here, as the dashboard reads events without ever posting them
+        import requests
+        try:
+            requests.post(EVENTS_WEBHOOK, json=records, timeout=5).raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f"Error posting stock events to {EVENTS_WEBHOOK}: {e}")
@@ -0,0 +1,143 @@
+"""Stock status queries behind the Dashboard page, per country and brand."""
+import pandas as pd
+
+from availability_rollup import ensure_availability_rollup, get_availability_trend
+from db import get_db_connection, run_once
+from frame_types import flag_category, typed_frame
+from stock_events import ensure_stock_events
+
+
+def read_from_db(country, brand):
+    conn = get_db_connection()
+    query = """
+    SELECT p.SKU, p.ProductName, ps.Date, ps.Status, ps.Type, ps.CurrentPrice, c.CountryCode, b.BrandName
+    FROM ProductStatus ps
+    JOIN Products p ON ps.ProductID = p.ProductID
+    JOIN Countries c ON ps.CountryID = c.CountryID
+    JOIN Brands b ON ps.BrandID = b.BrandID
+    WHERE c.CountryCode = %s AND b.BrandName = %s
+    """
+    df = pd.read_sql(query, conn, params=(country, brand))
+    conn.close()
+    return typed_frame(df, categories=('SKU', 'ProductName', 'Status', 'Type', 'CountryCode', 'BrandName'),
+                       prices=('CurrentPrice',), dates=('Date',))
+
+
+def get_dataframe_init(country, brand):
+    conn = get_db_connection()
+    query = """
+    SELECT p.SKU, ps.Date as LatestDate, ps.Status
+    FROM Products p
+    JOIN ProductStatus ps ON p.ProductID = ps.ProductID
+    JOIN Countries c ON ps.CountryID = c.CountryID
+    JOIN Brands b ON ps.BrandID = b.BrandID
+    JOIN (
+        SELECT ps.ProductID, MAX(ps.Date) as LatestDate
+        FROM ProductStatus ps
+        JOIN Countries c ON ps.CountryID = c.CountryID
+        JOIN Brands b ON ps.BrandID = b.BrandID
+        WHERE c.CountryCode = %s AND b.BrandName = %s AND ps.Status IN ('IN', 'OUT')
+        GROUP BY ps.ProductID
+    ) latest ON ps.ProductID = latest.ProductID AND ps.Date = latest.LatestDate
+    WHERE c.CountryCode = %s AND b.BrandName = %s
+    ORDER BY ps.Date DESC
+    """
+    
+    df = pd.read_sql(query, conn, params=(country, brand, country, brand))
+    conn.close()
+    return typed_frame(df, categories=('Status',), dates=('LatestDate',))
+
+
+def get_current_out_of_stock(country, brand):
+    conn = get_db_connection()
+    run_once(ensure_stock_events, conn)
+    # The last IN/OUT event of a SKU is its current status; an OUT event starts the current streak
+    query = """
+    WITH last_status AS (
+        SELECT
+            p.SKU,
+            e.EventDate,
+            e.EventType,
+            ROW_NUMBER() OVER (PARTITION BY e.ProductID ORDER BY e.EventDate DESC, e.EventID DESC) as rn
+        FROM StockEvents e
+        JOIN Products p ON e.ProductID = p.ProductID
+        JOIN Countries c ON e.CountryID = c.CountryID
+        JOIN Brands b ON e.BrandID = b.BrandID
+        WHERE c.CountryCode = %s AND b.BrandName = %s AND e.EventType IN ('IN', 'OUT')
+    )
+    SELECT 
+        SKU, 
+        EventDate as LastOutOfStockDate,
+        DATEDIFF(day, EventDate, GETDATE()) as DaysOutOfStock
+    FROM last_status
+    WHERE rn = 1 AND EventType = 'OUT'
+    ORDER BY DaysOutOfStock DESC
+    """
+    
+    df = pd.read_sql(query, conn, params=(country, brand))
+    conn.close()
+    return typed_frame(df, counts=('DaysOutOfStock',), dates=('LastOutOfStockDate',))
+
+
+def get_out_of_stock_history(country, brand):
+    conn = get_db_connection()
+    run_once(ensure_stock_events, conn)
+    # IN and OUT events alternate per SKU, so the event after an OUT is its back-in-stock event
+    query = """
+    WITH status_events AS (
+        SELECT 
+            p.SKU, 
+            e.EventDate,
+            e.EventType,
+            LEAD(e.EventDate) OVER (PARTITION BY e.ProductID ORDER BY e.EventDate, e.EventID) AS NextEventDate
+        FROM StockEvents e
+        JOIN Products p ON e.ProductID = p.ProductID
+        JOIN Countries c ON e.CountryID = c.CountryID
+        JOIN Brands b ON e.BrandID = b.BrandID
+        WHERE c.CountryCode = %s AND b.BrandName = %s AND e.EventType IN ('IN', 'OUT')
+    )
+    SELECT 
+        SKU, 
+        EventDate AS OutOfStockDate,
+        NextEventDate AS BackInStockDate,
+        DATEDIFF(day, EventDate, ISNULL(NextEventDate, GETDATE())) AS DaysOutOfStock
+    FROM status_events
+    WHERE EventType = 'OUT'
+    ORDER BY SKU, OutOfStockDate DESC
+    """
+    
+    df = pd.read_sql(query, conn, params=(country, brand))
+    conn.close()
+    typed_frame(df, categories=('SKU',), counts=('DaysOutOfStock',), dates=('OutOfStockDate', 'BackInStockDate'))
+    df['Status'] = flag_category(df['BackInStockDate'].notna(), 'Historical', 'Currently out of stock')
+    return df
+
+
+def get_availability_trend_data(days):
+    conn = get_db_connection()
+    run_once(ensure_availability_rollup, conn)
+    df = get_availability_trend(conn, days)
+    conn.close()
+    return df
+
+
+def get_export_frames(country, brand):
+    """Out of stock products, in stock products and skipped URLs of the market's last run.
+
+    Read from the run store; without a run of the market there, the latest
+    status per SKU comes from the database and there are no skipped URLs.
+    """
+    # pyarrow is only needed once a user exports
+    import run_store
+
+    run_id = run_store.latest_run_id(country, brand)
+    if run_id is None:
+        df = get_dataframe_init(country, brand)
+        skipped = pd.DataFrame(columns=run_store.SKIPPED_COLUMNS)
+    else:
+        df = run_store.load('products', columns=['SKU', 'Product Name', 'Date', 'URL', 'Status', 'Type', 'Price'],
+                            countries=[country], brands=[brand], run_ids=[run_id])
+        skipped = run_store.load('skipped', columns=run_store.SKIPPED_COLUMNS, countries=[country],
+                                 brands=[brand], run_ids=[run_id])
+    status = df['Status'].astype(object)
+    return df[status == 'OUT'], df[status == 'IN'], skipped
@@ -1,24 +1,12 @@
 import streamlit as st
 from time import sleep
 from navigation import make_sidebar
-import pymssql
+from logging_setup import setup_logging
+from db import get_db_connection, run_once
 from datetime import datetime
 
-# Azure SQL Database connection parameters
-SERVER = 'stockscraper-server.database.windows.net'
-DATABASE = 'stockscraper-database'
-USERNAME = 'stockscraper-server-admin'
-PASSWORD = 'uc$DjSo7J6kqkoak'
+setup_logging()
 
-# Add this at the beginning of your app, after the imports
-st.markdown("""
-    <style>
-    [data-testid="stSidebarNav"] {display: none;}
-    </style>
-    """, unsafe_allow_html=True)
-
-def get_db_connection():
-    return pymssql.connect(server=SERVER, user=USERNAME, password=PASSWORD, database=DATABASE)
 
 def check_credentials(username, password):
     conn = get_db_connection()
@@ -80,7 +68,7 @@ def create_login_logs_table():
     conn.close()
 
 # Call this function at the beginning of your script
-create_login_logs_table()
+run_once(create_login_logs_table)
 
 make_sidebar()
 
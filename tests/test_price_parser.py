@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from price_parser import normalize_prices
+
+
+@pytest.mark.parametrize('storage', ['python', 'pyarrow'])
+@pytest.mark.parametrize('raw, expected', [
+    ('199,99 €', 199.99),
+    ('199,99\xa0€', 199.99),
+    ('1\u202f299,00\xa0€', 1299.0),
+    ('1\xa0299,00 €', 1299.0),
+    ('€ 1.299,00', 1299.0),
+    ('199,-', 199.0),
+])
+def test_normalize_prices_strips_no_break_spaces(storage, raw, expected):
+    prices, unparseable = normalize_prices(pd.Series([raw], dtype=pd.StringDtype(storage)))
+    assert prices.tolist() == [expected]
+    assert unparseable.empty
+
+
+def test_normalize_prices_of_scraped_strings():
+    prices, _ = normalize_prices(['199,99\xa0€', '1\u202f299,00 €'])
+    assert prices.tolist() == [199.99, 1299.0]
+
+
+def test_normalize_prices_reports_unparseable():
+    prices, unparseable = normalize_prices(pd.Series(['N/A', 'gratis', '12,50']))
+    assert prices.isna().tolist() == [True, True, False]
+    assert unparseable.tolist() == ['gratis']